@@ -1,32 +1,75 @@
-from pygame import Rect
+from bisect import bisect_right
+from typing import NamedTuple
 
 
-class Frame(object):
-    def __init__(self, col: Rect, src: Rect, delay: int):
-        self.collision: Rect = col
-        self.src: Rect = src
-        self.delay = delay
+class ClipFrame(NamedTuple):
+    ''' Region of the sprite sheet and where it is drawn relative to the entity rect '''
+    src: tuple
+    offset: tuple = (0, 0)
 
 
-class Action(object):
-    def __init__(self, frames: list):
-        self.tick: int = 0
-        self.index: int = 0
-        self.frames: list = frames
+class Clip(object):
+    '''
+    Immutable sequence of frames with the cumulative time, in ms, at which
+    each frame ends. Playback holds on the last frame.
+    '''
 
-    def next_frame(self) -> Frame:
-        frame: Frame = self.frames[self.index]
-        if self.tick > frame.delay:
-            self.tick = 0
-            self.index += 1
-            if self.index >= len(self.frames):
-                self.index = len(self.frames) - 1
-        self.tick += 1
-        return frame
+    def __init__(self, frames: list, durations: list):
+        self.frames: tuple = tuple(frames)
+        ends: list = []
+        total: int = 0
+        for duration in durations:
+            total += duration
+            ends.append(total)
+        self.ends: tuple = tuple(ends)
+        self.duration: int = total
+        self.last: int = len(self.frames) - 1
+
+    @staticmethod
+    def uniform(frames: list, duration: int) -> 'Clip':
+        return Clip(frames, [duration] * len(frames))
+
+    def index_at(self, elapsed: int) -> int:
+        return min(bisect_right(self.ends, elapsed), self.last)
+
+
+class ClipRegistry(object):
+    ''' Clips shared by every entity, keyed by sprite sheet and name '''
+
+    def __init__(self):
+        self.clips: dict = {}
+
+    def register(self, spr, name: str, clip: Clip) -> None:
+        self.clips[(spr, name)] = clip
+
+    def get(self, spr, name: str) -> Clip:
+        return self.clips[(spr, name)]
+
+
+class Playhead(object):
+    ''' Per entity playback position of a shared clip '''
+    __slots__ = ('clip', 'elapsed')
+
+    def __init__(self, clip: Clip):
+        self.clip: Clip = clip
+        self.elapsed: int = 0
+
+    def play(self, clip: Clip) -> None:
+        ''' Switch clip, playback restarts only when the clip changes '''
+        if clip is not self.clip:
+            self.clip = clip
+            self.elapsed = 0
 
     def reset(self) -> None:
-        self.tick = 0
-        self.index = 0
+        self.elapsed = 0
+
+    def advance(self, time: int) -> ClipFrame:
+        self.elapsed += time
+        return self.frame()
+
+    def frame(self) -> ClipFrame:
+        return self.clip.frames[self.clip.index_at(self.elapsed)]
 
     def is_completed(self) -> bool:
-        return self.index == (len(self.frames) - 1)
+        ''' True once the last frame is reached '''
+        return self.clip.index_at(self.elapsed) == self.clip.last
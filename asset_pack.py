@@ -0,0 +1,149 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from pygame import Surface, display, image, mixer, SRCALPHA
+
+
+class AssetPack(object):
+    '''
+    Decoded sprite sheets and sound samples in a single file that is mapped
+    into memory, so startup skips the PNG and WAV decoding. Images are stored
+    as 32 bit BGRA, the layout of `convert_alpha` surfaces on little endian
+    machines, and sounds as PCM in the mixer format used to build the pack.
+
+    Layout: header (magic, version, index length), JSON index, then every
+    asset aligned to ALIGN bytes. Each index entry records the size and
+    modification time of its source file; entries whose source changed are
+    ignored and the caller decodes the source file instead.
+    '''
+    MAGIC = b'PXPK'
+    VERSION = 1
+    HEADER = struct.Struct('<4sII')
+    ALIGN = 64
+
+    def __init__(self, path: str):
+        self.path: str = path
+        self.index: dict = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        self.__opened: bool = False
+        self.__view: memoryview = None
+
+    def open(self) -> bool:
+        ''' Map the pack, returns False when it is missing or from another version '''
+        self.__opened = True
+        try:
+            with open(self.path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        magic, version, length = self.HEADER.unpack_from(data) if len(data) >= self.HEADER.size else (b'', 0, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            data.close()
+            return False
+        self.index = json.loads(data[self.HEADER.size:self.HEADER.size + length])
+        ''' Surfaces and sounds keep slices of the view, the map is never closed '''
+        self.__view = memoryview(data)
+        return True
+
+    def image(self, source: str) -> Surface:
+        ''' Surface sharing the mapped pixels, None when the source has to be decoded '''
+        entry = self.__entry(source, 'image')
+        if self.__count(entry) is False:
+            return None
+        return image.frombuffer(self.__slice(entry), tuple(entry['size']), 'BGRA')
+
+    def sound(self, source: str) -> mixer.Sound:
+        ''' Sound built from the mapped samples, None when the source has to be decoded '''
+        entry = self.__entry(source, 'sound')
+        if entry is not None and list(mixer.get_init() or ()) != entry['format']:
+            entry = None
+        if self.__count(entry) is False:
+            return None
+        return mixer.Sound(buffer=self.__slice(entry))
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def __entry(self, source: str, kind: str) -> dict:
+        if self.__opened is False:
+            self.open()
+        entry = self.index.get(source)
+        if entry is not None and entry['kind'] == kind:
+            try:
+                stat = os.stat(source)
+            except OSError:
+                stat = None
+            if stat is not None and stat.st_mtime_ns == entry['mtime'] and stat.st_size == entry['bytes']:
+                return entry
+        return None
+
+    def __count(self, entry: dict) -> bool:
+        if entry is None:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def __slice(self, entry: dict) -> memoryview:
+        return self.__view[entry['offset']:entry['offset'] + entry['length']]
+
+    @classmethod
+    def build(cls, path: str, images: list, sounds: list) -> dict:
+        ''' Decode every source and write a new pack, needs the display and mixer modules initialized '''
+        index: dict = {}
+        blobs: list = []
+        for source in images:
+            ''' Same pixels as convert_alpha, palette colorkeys become transparent '''
+            surface = image.load(source).convert(32, SRCALPHA)
+            blobs.append((source, 'image', image.tobytes(surface, 'BGRA'), {'size': surface.get_size()}))
+        for source in sounds:
+            sound = mixer.Sound(source)
+            blobs.append((source, 'sound', sound.get_raw(), {'format': list(mixer.get_init())}))
+
+        offset = 0
+        for source, kind, data, extra in blobs:
+            stat = os.stat(source)
+            index[source] = dict(kind=kind, mtime=stat.st_mtime_ns, bytes=stat.st_size, offset=offset,
+                                 length=len(data), **extra)
+            offset += -(-len(data) // cls.ALIGN) * cls.ALIGN
+        ''' Offsets are relative until the index size is known '''
+        header = json.dumps(index).encode()
+        start = -(-(cls.HEADER.size + len(header) + 16 * len(index)) // cls.ALIGN) * cls.ALIGN
+        for entry in index.values():
+            entry['offset'] += start
+        header = json.dumps(index).encode()
+        if cls.HEADER.size + len(header) > start:
+            raise ValueError("Asset pack index outgrew its reserved space")
+
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(header)))
+            f.write(header)
+            for (_, _, data, _), entry in zip(blobs, index.values()):
+                f.seek(entry['offset'])
+                f.write(data)
+        os.replace(tmp, path)
+        return index
+
+
+PACK: AssetPack = AssetPack('assets/assets.pack')
+
+
+def main() -> int:
+    ''' Rebuild the pack from the assets the game loads '''
+    from game import LoadState
+    from sound_manager import SoundManager
+    display.init()
+    mixer.init()
+    index = AssetPack.build(PACK.path, [path for _, path in LoadState.IMAGES],
+                            [sound[0] for sound in SoundManager.SOUNDS.values()])
+    size = os.path.getsize(PACK.path)
+    print("{} assets, {:.1f} MiB written to {}".format(len(index), size / 1024 / 1024, PACK.path))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+import json
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from random import seed, randint
+from time import perf_counter
+from pygame import Rect
+from renderer import SdlRenderer, Renderer, use_headless_drivers
+from capture import FrameCapture
+from engine import Engine
+from controls import VirtualInput, State
+from game import LoadState, GetReadyState, PlayState
+from rng import RNG
+from collision import MASKS
+from sprites import Asteroid, Bullet, DiagUpBullet, DiagDownBullet, Explosion, FontSprite, PowerUp, POOLS, pool_stats
+
+
+class PhaseTimer(object):
+    '''
+    Wrap methods of live objects so the time spent in them is summed per
+    frame, the wrapped objects keep working as before.
+    '''
+
+    def __init__(self):
+        self.samples: dict = {}
+        self.current: dict = {}
+
+    def wrap(self, obj: object, method: str, phase: str) -> None:
+        original = getattr(obj, method)
+        self.samples.setdefault(phase, [])
+        self.current.setdefault(phase, 0.0)
+
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.current[phase] += perf_counter() - start
+        setattr(obj, method, timed)
+
+    def end_frame(self) -> None:
+        for phase, elapsed in self.current.items():
+            self.samples[phase].append(elapsed * 1000)
+            self.current[phase] = 0.0
+
+    def reset(self) -> None:
+        for phase in self.samples:
+            self.samples[phase] = []
+            self.current[phase] = 0.0
+
+
+def percentile(values: list, p: float) -> float:
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Scenario(object):
+    ''' A named workload built on top of a fresh PlayState '''
+    name = 'idle'
+    description = 'Default PlayState with a firing craft'
+
+    def setup(self, state: PlayState) -> None:
+        pass
+
+    def refill(self, state: PlayState) -> None:
+        ''' Called before every frame to keep the workload at its target size '''
+        pass
+
+    def draw(self, state: PlayState, renderer: Renderer) -> None:
+        ''' Extra drawing done after the state has drawn '''
+        pass
+
+
+class AsteroidsScenario(Scenario):
+    name = 'asteroids-1k'
+    description = '1000 live asteroids spread across the screen'
+    COUNT = 1000
+
+    def refill(self, state: PlayState) -> None:
+        boundary = state.renderer.bb_size
+        items = state.asteroids.items
+        while len(items) < self.COUNT:
+            asteroid = POOLS[Asteroid].acquire(boundary)
+            asteroid.rect.left = randint(0, boundary[0])
+            items.append(asteroid)
+
+
+class BulletsScenario(Scenario):
+    name = 'bullets-500'
+    description = '500 live bullets with the triple-shot power-up and 50 asteroids'
+    COUNT = 500
+    ASTEROIDS = 50
+
+    def setup(self, state: PlayState) -> None:
+        state.craft.power_up(PowerUp.BUILD_POWER)
+
+    def refill(self, state: PlayState) -> None:
+        boundary = state.renderer.bb_size
+        bullets = state.craft.bullets
+        while len(bullets) < self.COUNT:
+            src = Rect(randint(0, boundary[0] // 2), randint(0, boundary[1]), 1, 1)
+            for bullet in [POOLS[Bullet].acquire(), POOLS[DiagUpBullet].acquire(), POOLS[DiagDownBullet].acquire()]:
+                bullet.align(src)
+                bullets.append(bullet)
+        items = state.asteroids.items
+        while len(items) < self.ASTEROIDS:
+            asteroid = POOLS[Asteroid].acquire(boundary)
+            asteroid.rect.left = randint(boundary[0] // 2, boundary[0])
+            items.append(asteroid)
+
+
+class ExplosionsScenario(Scenario):
+    name = 'explosions-200'
+    description = '200 simultaneous explosions'
+    COUNT = 200
+
+    def refill(self, state: PlayState) -> None:
+        boundary = state.renderer.bb_size
+        bullets = state.craft.bullets
+        while len(bullets) < self.COUNT:
+            rect = Rect(randint(0, boundary[0]), randint(0, boundary[1]), 32, 32)
+            bullets.append(POOLS[Explosion].acquire(randint(0, 1), rect))
+
+
+class EnemyBulletsScenario(Scenario):
+    name = 'enemy-bullets-10k'
+    description = '10000 live enemy pattern bullets'
+    COUNT = 10000
+
+    def refill(self, state: PlayState) -> None:
+        boundary = state.renderer.bb_size
+        field = state.asteroids.bullets
+        while field.count < self.COUNT:
+            field.radial(randint(0, boundary[0]), randint(0, boundary[1]), 64, 0.5, randint(0, 6), randint(0, 2))
+
+
+class HudScenario(Scenario):
+    name = 'hud'
+    description = '20 lines of text changing every frame on top of the score'
+    LINES = 20
+
+    def setup(self, state: PlayState) -> None:
+        self.fonts = [FontSprite('hud-{}'.format(i), (8, 24 + i * 10)) for i in range(self.LINES)]
+        self.frame = 0
+
+    def draw(self, state: PlayState, renderer: Renderer) -> None:
+        self.frame += 1
+        for i, font in enumerate(self.fonts):
+            font.display(str(self.frame * (i + 1)).zfill(16))
+            font.draw(renderer)
+
+
+SCENARIOS = [Scenario, AsteroidsScenario, BulletsScenario, ExplosionsScenario, EnemyBulletsScenario, HudScenario]
+
+
+class Benchmark(object):
+    WARMUP = 30
+    MEMORY_FRAMES = 60
+
+    def __init__(self, frames: int = 300, capture: str = None):
+        use_headless_drivers()
+        self.frames: int = frames
+        self.renderer: SdlRenderer = SdlRenderer(320, 240, 800, 600)
+        if capture is not None:
+            ''' Frames the writer can not keep up with are dropped, the timings include only the copy '''
+            self.renderer.capture = FrameCapture(capture, self.renderer.backbuffer)
+        self.engine: Engine = Engine(self.renderer, headless=True)
+        self.input: VirtualInput = VirtualInput()
+        self.input.buttons.pressed(State.X)
+
+    def create_state(self, scenario: Scenario) -> PlayState:
+        seed(0)
+        RNG.seed(0)
+        state = PlayState(GetReadyState(LoadState(self.renderer)), 0)
+        ''' Keep the craft alive so the workload does not change mid run '''
+        state.craft.destroy = lambda: None
+        scenario.setup(state)
+        draw = state.draw
+
+        def draw_scenario(renderer: Renderer) -> None:
+            draw(renderer)
+            scenario.draw(state, renderer)
+        state.draw = draw_scenario
+        return state
+
+    def run(self, scenario_class: type) -> dict:
+        scenario: Scenario = scenario_class()
+        state = self.create_state(scenario)
+        timer = PhaseTimer()
+        timer.wrap(state, 'update', 'PlayState.update')
+        timer.wrap(state.asteroids, 'collide', 'AsteroidWave.collide')
+        timer.wrap(state.craft, 'update_bullets', 'Craft.update_bullets')
+        timer.wrap(state.background, 'draw', 'Background.draw')
+        timer.wrap(self.renderer, 'draw_to_screen', 'SdlRenderer.draw_to_screen')
+        timer.wrap(self.engine, 'step', 'frame')
+        for i in range(self.WARMUP + self.frames):
+            if i == self.WARMUP:
+                timer.reset()
+                pools_before = pool_stats()
+                masks_before = MASKS.stats()
+            self.frame(scenario, state)
+            timer.end_frame()
+        del self.engine.step
+        del self.renderer.draw_to_screen
+
+        pools: dict = {}
+        for name, stats in pool_stats().items():
+            pools[name] = {
+                'hits': stats['hits'] - pools_before[name]['hits'],
+                'misses': stats['misses'] - pools_before[name]['misses'],
+            }
+        phases: dict = {}
+        for phase, samples in timer.samples.items():
+            phases[phase] = {
+                'p50': percentile(samples, 50),
+                'p95': percentile(samples, 95),
+                'p99': percentile(samples, 99),
+                'max': max(samples) if samples else 0.0,
+            }
+        return {
+            'description': scenario.description,
+            'frames': self.frames,
+            'phases': phases,
+            'pools': pools,
+            'collision': {name: value - masks_before[name] for name, value in MASKS.stats().items()},
+            'renderer': self.renderer.stats(),
+            'peak_memory_kb': self.peak_memory(scenario_class),
+        }
+
+    def frame(self, scenario: Scenario, state: PlayState) -> None:
+        scenario.refill(state)
+        self.engine.step(state, 1, self.input)
+
+    def peak_memory(self, scenario_class: type) -> float:
+        ''' Separate pass, tracemalloc slows the frames down too much to time them '''
+        scenario: Scenario = scenario_class()
+        state = self.create_state(scenario)
+        tracemalloc.start()
+        for _ in range(self.MEMORY_FRAMES):
+            self.frame(scenario, state)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak / 1024
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    ''' Return a description of every metric that regressed past the threshold '''
+    regressions: list = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        metrics = [('frame p50', result['phases']['frame']['p50'], base['phases']['frame']['p50']),
+                   ('frame p95', result['phases']['frame']['p95'], base['phases']['frame']['p95']),
+                   ('peak memory', result['peak_memory_kb'], base['peak_memory_kb'])]
+        for metric, current, previous in metrics:
+            if previous > 0 and current > previous * (1 + threshold):
+                regressions.append("{}: {} {:.2f} -> {:.2f} (+{:.0%})".format(
+                    name, metric, previous, current, current / previous - 1))
+    return regressions
+
+
+def report(name: str, result: dict) -> None:
+    print("{} - {}".format(name, result['description']))
+    print("  {:<28}{:>9}{:>9}{:>9}{:>9}".format('phase (ms/frame)', 'p50', 'p95', 'p99', 'max'))
+    for phase, stats in result['phases'].items():
+        print("  {:<28}{:>9.3f}{:>9.3f}{:>9.3f}{:>9.3f}".format(
+            phase, stats['p50'], stats['p95'], stats['p99'], stats['max']))
+    print("  peak memory {:.0f} KiB".format(result['peak_memory_kb']))
+    print("  renderer {commands} commands in {draw_calls} draw calls on the last frame".format(**result['renderer']))
+    print("  pools " + ", ".join("{} {}/{}".format(name, stats['hits'], stats['misses'])
+                                 for name, stats in result['pools'].items()) + " (hits/misses)")
+    print("  collision {tests} rect hits, {confirmed} confirmed by pixel masks".format(**result['collision']))
+
+
+def main() -> int:
+    names = [scenario.name for scenario in SCENARIOS]
+    parser = ArgumentParser(description="Run the stress scenarios and compare them against a baseline")
+    parser.add_argument("scenarios", nargs="*", metavar="SCENARIO",
+                        help="scenarios to run, all when omitted: " + ", ".join(names))
+    parser.add_argument("--frames", type=int, default=300, help="measured frames per scenario")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a JSON baseline")
+    parser.add_argument("--capture", metavar="PATH", help="record the frames of all scenarios, see main.py --capture")
+    parser.add_argument("--compare", metavar="PATH", help="fail when results regress against this baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed regression as a fraction of the baseline (default 0.2)")
+    args = parser.parse_args()
+    for name in args.scenarios:
+        if name not in names:
+            parser.error("unknown scenario " + name)
+
+    benchmark = Benchmark(args.frames, args.capture)
+    results: dict = {}
+    for scenario in SCENARIOS:
+        if args.scenarios and scenario.name not in args.scenarios:
+            continue
+        results[scenario.name] = benchmark.run(scenario)
+        report(scenario.name, results[scenario.name])
+    capture = benchmark.renderer.capture
+    if capture is not None:
+        capture.close()
+        print("{captured} frames captured, {dropped} dropped".format(**capture.stats()))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import numpy as np
+from controls import VirtualInput, State
+from rng import RNG
+
+
+class BotInput(VirtualInput):
+    '''
+    Plays the game on its own: steers to power-ups, lines up with the next
+    asteroid to shoot it and sidesteps asteroids and enemy bullets coming
+    at the craft. Set `state` to the current game state before every tick,
+    the bot idles in states without a live craft.
+    '''
+    HOME_X = 48  # Left edge the craft keeps when not chasing a power-up
+    LOOKAHEAD = 64  # Asteroids closer than this in front of the craft are dodged
+    BULLET_RANGE = 20  # Enemy bullets closer than this to the craft center are dodged
+    AIM_MARGIN = 6  # Vertical slack when lining up with an asteroid
+    DEADBAND = 3  # Distance to a target that counts as reached
+    WANDER_TICKS = 90  # Ticks between picks of a new idle height
+
+    def __init__(self):
+        super().__init__()
+        self.state = None
+        self.rng = RNG.get('bot')
+        self.ticks: int = 0
+        self.__wander: int = 0
+
+    def on_event(self) -> None:
+        self.ticks += 1
+        craft = getattr(self.state, 'craft', None)
+        if craft is None or craft.is_alive() is False:
+            self.direction.update(0, 0)
+            self.buttons.reset()
+            return
+        rect = craft.rect
+        boundary = craft.boundary
+        if self.ticks % self.WANDER_TICKS == 0:
+            self.__wander = self.rng.randint(rect.height, boundary[1] - rect.height)
+        asteroids = getattr(self.state, 'asteroids', None)
+        items = [] if asteroids is None else [item for item in asteroids.items if item.is_alive()]
+        ahead = [item for item in items if item.rect.right > rect.left]
+
+        target_x, target_y = self.HOME_X, self.__wander
+        powerups = getattr(self.state, 'powerups', [])
+        if len(powerups) > 0:
+            powerup = min(powerups, key=lambda p: abs(p.rect.centerx - rect.centerx) + abs(p.rect.centery - rect.centery))
+            target_x, target_y = powerup.rect.left, powerup.rect.centery
+        elif len(ahead) > 0:
+            target_y = min(ahead, key=lambda item: item.rect.left).rect.centery
+
+        dodge = self.__dodge(rect, boundary, ahead, asteroids)
+        x = self.__steer(rect.left, target_x)
+        y = dodge if dodge != 0 else self.__steer(rect.centery, target_y)
+        self.direction.update(x, y)
+
+        ''' Tap fire instead of holding it, every press edge shoots right away '''
+        aimed = any(item.rect.top - self.AIM_MARGIN < rect.centery < item.rect.bottom + self.AIM_MARGIN
+                    for item in ahead)
+        if aimed and self.buttons.is_pressed(State.X) is False:
+            self.buttons.pressed(State.X)
+        else:
+            self.buttons.released(State.X)
+
+    def __steer(self, position: int, target: int) -> int:
+        if abs(target - position) <= self.DEADBAND:
+            return 0
+        return 1 if target > position else -1
+
+    def __dodge(self, rect, boundary: tuple, ahead: list, asteroids) -> int:
+        ''' Vertical direction away from the closest threat, 0 when nothing is close '''
+        threat_y = None
+        for item in ahead:
+            if item.rect.left - rect.right < self.LOOKAHEAD \
+                    and item.rect.top - rect.height < rect.centery < item.rect.bottom + rect.height:
+                threat_y = item.rect.centery
+                break
+        if threat_y is None and asteroids is not None and asteroids.bullets.count > 0:
+            field = asteroids.bullets
+            offset = field.pos[:field.count] - (rect.centerx, rect.centery)
+            near = np.all(np.abs(offset) < self.BULLET_RANGE, axis=1)
+            if near.any():
+                threat_y = rect.centery + float(offset[near, 1].mean())
+        if threat_y is None:
+            return 0
+        y = -1 if threat_y >= rect.centery else 1
+        ''' Turn around at the screen edges '''
+        if y < 0 and rect.top <= rect.height:
+            return 1
+        if y > 0 and rect.bottom >= boundary[1] - rect.height:
+            return -1
+        return y
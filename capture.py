@@ -0,0 +1,118 @@
+import os
+import numpy as np
+from queue import Queue, Empty
+from threading import Thread
+from pygame import Surface, image
+
+
+class FrameCapture(object):
+    '''
+    Records the backbuffer to disk without stalling the frame. `grab` copies
+    the surface pixels into a free slot of a preallocated ring, one memcpy,
+    and a writer thread drains filled slots to the output. When the writer
+    falls behind and no slot is free the frame is counted as dropped
+    instead of waiting, unless `block` is set for offline runs where frame
+    time does not matter.
+
+    RAW writes the 32 bit pixels as they are (bgr0, for ffmpeg's rawvideo),
+    Y4M writes 4:4:4 YUV frames and PNG writes one image per frame, `path`
+    being a pattern like "capture/frame-{:06d}.png". The surface has to be
+    32 bit xRGB, the layout of the backbuffer.
+    '''
+    RAW = 'raw'
+    Y4M = 'y4m'
+    PNG = 'png'
+    SLOTS = 8
+    MASKS = (0xFF0000, 0xFF00, 0xFF)
+
+    def __init__(self, path: str, surface: Surface, format: str = None, fps: int = 30, slots: int = SLOTS,
+                 block: bool = False):
+        if surface.get_bitsize() != 32 or surface.get_masks()[:3] != self.MASKS:
+            raise ValueError("Can only capture 32 bit xRGB surfaces")
+        self.format: str = self.detect(path) if format is None else format
+        if self.format == self.PNG and '{' not in path:
+            root, extension = os.path.splitext(path)
+            path = root + '-{:06d}' + extension
+        self.path: str = path
+        self.size: tuple = surface.get_size()
+        self.pitch: int = surface.get_pitch()
+        self.fps: int = fps
+        self.block: bool = block
+        self.captured: int = 0
+        self.written: int = 0
+        self.dropped: int = 0
+        self.__slots: list = [np.empty(self.pitch * self.size[1], dtype=np.uint8) for _ in range(slots)]
+        self.__free: Queue = Queue()
+        self.__filled: Queue = Queue()
+        for i in range(slots):
+            self.__free.put(i)
+        self.__file = None
+        if self.format == self.PNG:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        else:
+            self.__file = open(path, 'wb')
+            if self.format == self.Y4M:
+                header = "YUV4MPEG2 W{} H{} F{}:1 Ip A1:1 C444\n".format(self.size[0], self.size[1], fps)
+                self.__file.write(header.encode())
+        self.__thread = Thread(target=self.__write_loop, name='FrameCapture', daemon=True)
+        self.__thread.start()
+
+    @classmethod
+    def detect(cls, path: str) -> str:
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.y4m':
+            return cls.Y4M
+        if extension == '.png':
+            return cls.PNG
+        return cls.RAW
+
+    def grab(self, surface: Surface) -> None:
+        try:
+            i = self.__free.get(self.block)
+        except Empty:
+            self.dropped += 1
+            return
+        ''' The buffer proxy locks the surface, it is released as soon as the copy is done '''
+        buffer = surface.get_buffer()
+        np.copyto(self.__slots[i], np.frombuffer(buffer, dtype=np.uint8))
+        del buffer
+        self.captured += 1
+        self.__filled.put(i)
+
+    def close(self) -> None:
+        ''' Write out the remaining frames and stop the writer '''
+        self.__filled.put(None)
+        self.__thread.join()
+        if self.__file is not None:
+            self.__file.close()
+
+    def stats(self) -> dict:
+        return {'captured': self.captured, 'written': self.written, 'dropped': self.dropped}
+
+    def __write_loop(self) -> None:
+        while True:
+            i = self.__filled.get()
+            if i is None:
+                return
+            self.__write(self.__slots[i])
+            self.written += 1
+            self.__free.put(i)
+
+    def __write(self, slot: np.ndarray) -> None:
+        width, height = self.size
+        pixels = slot.reshape(height, self.pitch // 4, 4)[:, :width]
+        if self.format == self.RAW:
+            self.__file.write(pixels.tobytes())
+        elif self.format == self.Y4M:
+            ''' BT.601 studio range, the default of Y4M readers '''
+            b, g, r = (pixels[:, :, c].astype(np.float32) for c in range(3))
+            y = 16 + 0.257 * r + 0.504 * g + 0.098 * b
+            u = 128 - 0.148 * r - 0.291 * g + 0.439 * b
+            v = 128 + 0.439 * r - 0.368 * g - 0.071 * b
+            self.__file.write(b'FRAME\n')
+            self.__file.write(np.stack((y, u, v)).round().astype(np.uint8).tobytes())
+        else:
+            frame = image.frombuffer(pixels[:, :, 2::-1].tobytes(), self.size, 'RGB')
+            image.save(frame, self.path.format(self.written))
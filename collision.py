@@ -0,0 +1,127 @@
+from typing import Optional
+from pygame import Rect, image
+from pygame.mask import Mask, from_surface
+from asset_pack import PACK
+
+
+class SpatialHash(object):
+    '''
+    Uniform grid over the backbuffer used as collision broadphase.
+    Items are bucketed, per group, into every cell their rect overlaps.
+    Anything outside the boundary lands in the border cells so queries
+    never miss an item, they only return a few more candidates. Each group
+    also keeps the union of its rects, which rejects most queries with a
+    single rect test when the group is small or clustered.
+    '''
+
+    def __init__(self, boundary: tuple, cell_size: int = 32):
+        self.cell_size: int = cell_size
+        self.cols: int = boundary[0] // cell_size + 3
+        self.rows: int = boundary[1] // cell_size + 3
+        self.cells: dict = {}
+        self.bounds: dict = {}
+        self.count: int = 0
+
+    def clear(self) -> None:
+        self.cells.clear()
+        self.bounds.clear()
+        self.count = 0
+
+    def insert(self, item, group: int = 0) -> None:
+        ''' Add an item by its `rect`, items keep their insertion order in queries '''
+        rect = item.rect
+        entry = (self.count, item)
+        self.count += 1
+        bounds = self.bounds.get(group)
+        if bounds is None:
+            self.bounds[group] = Rect(rect)
+        else:
+            bounds.union_ip(rect)
+        cells = self.cells
+        for key in self.__keys(rect, group):
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = [entry]
+            else:
+                cell.append(entry)
+
+    def query(self, rect: Rect, group: int = 0) -> list:
+        ''' Items of the group that share at least one cell with the rect '''
+        bounds = self.bounds.get(group)
+        if bounds is None or bounds.colliderect(rect) == 0:
+            return []
+        cells = self.cells
+        found: list = []
+        for key in self.__keys(rect, group):
+            cell = cells.get(key)
+            if cell is not None:
+                found.extend(cell)
+        if len(found) == 0:
+            return []
+        if len(found) > 1:
+            ''' Drop duplicates from items spanning cells, restore insertion order '''
+            found = sorted(set(found), key=lambda entry: entry[0])
+        return [item for _, item in found]
+
+    def __keys(self, rect: Rect, group: int) -> tuple:
+        size = self.cell_size
+        cols = self.cols
+        rows = self.rows
+        x0 = min(max(rect.left // size + 1, 0), cols - 1)
+        x1 = min(max((rect.right - 1) // size + 1, x0), cols - 1)
+        y0 = min(max(rect.top // size + 1, 0), rows - 1)
+        y1 = min(max((rect.bottom - 1) // size + 1, y0), rows - 1)
+        base = group * rows * cols
+        if x0 == x1 and y0 == y1:
+            return (base + y0 * cols + x0,)
+        return tuple(base + y * cols + x for y in range(y0, y1 + 1) for x in range(x0, x1 + 1))
+
+
+class MaskCache(object):
+    '''
+    Pixel masks of sprite frames, built once per (image, src rect) at load
+    and only for the frames of sprites that collide per pixel. `overlap` is
+    the narrowphase, to call once the rects of two objects collide. Masks
+    are placed at the top left of the rect, a side without a mask counts as
+    its whole rect.
+    '''
+
+    def __init__(self):
+        self.masks: dict = {}
+        self.__solid: dict = {}  # Full masks by size, for the sides without one
+        self.tests: int = 0  # Rect hits that reached the narrowphase
+        self.confirmed: int = 0  # Of those, the ones whose pixels overlap
+
+    def build(self, name, filepath: str, srcs) -> None:
+        surface = PACK.image(filepath)
+        if surface is None:
+            surface = image.load(filepath)
+        for src in srcs:
+            self.masks[(name, tuple(src))] = from_surface(surface.subsurface(src))
+
+    def get(self, name, src) -> Optional[Mask]:
+        return self.masks.get((name, tuple(src)))
+
+    def overlap(self, mask: Optional[Mask], rect: Rect, other_mask: Optional[Mask], other: Rect) -> bool:
+        self.tests += 1
+        if mask is not None or other_mask is not None:
+            if mask is None:
+                mask = self.__solid_mask(rect.size)
+            if other_mask is None:
+                other_mask = self.__solid_mask(other.size)
+            if mask.overlap(other_mask, (other.left - rect.left, other.top - rect.top)) is None:
+                return False
+        self.confirmed += 1
+        return True
+
+    def stats(self) -> dict:
+        return {'tests': self.tests, 'confirmed': self.confirmed}
+
+    def __solid_mask(self, size: tuple) -> Mask:
+        mask = self.__solid.get(size)
+        if mask is None:
+            mask = self.__solid[size] = Mask(size, fill=True)
+        return mask
+
+
+MASKS: MaskCache = MaskCache()
@@ -2,9 +2,10 @@ from enum import Enum
 import pygame
 from pygame.event import Event
 from typing import Optional
-from pygame.joystick import Joystick, get_count
+from pygame.joystick import Joystick
 from pygame.locals import K_LEFT, K_RIGHT, K_UP, K_DOWN, \
-    K_a, K_s, K_d, K_z, K_x, K_c, K_RETURN
+    K_a, K_s, K_d, K_z, K_x, K_c, K_RETURN, JOYBUTTONDOWN, JOYBUTTONUP, \
+    JOYHATMOTION, JOYAXISMOTION, JOYDEVICEADDED, JOYDEVICEREMOVED
 
 
 class State(Enum):
@@ -28,6 +29,18 @@ class State(Enum):
 
 
 class Direction(object):
+    ''' State of every (x, y) pair, y is 1 for up '''
+    STATES = {
+        (0, 0): State.IDLE,
+        (-1, 1): State.UPLEFT,
+        (1, 1): State.UPRIGHT,
+        (-1, -1): State.DOWNLEFT,
+        (1, -1): State.DOWNRIGHT,
+        (0, 1): State.UP,
+        (0, -1): State.DOWN,
+        (-1, 0): State.LEFT,
+        (1, 0): State.RIGHT,
+    }
 
     def __init__(self):
         self.x = 0
@@ -38,75 +51,98 @@ class Direction(object):
         self.y = y
 
     def get_active(self) -> Optional[str]:
-        for state, value in self.__states().items():
-            if value is True:
-                return state
+        return self.STATES.get((self.x, self.y))
 
     def get(self, state: str) -> bool:
         '''
         Get the status of a state
         '''
-        states = self.__states()
-        if state in states:
-            return states.get(state)
-        return False
+        return self.STATES.get((self.x, self.y)) == state
 
     def is_idle(self) -> bool:
         return self.x == 0 and self.y == 0
 
-    def __states(self):
-        return {
-            State.IDLE: self.x == 0 and self.y == 0,
-            State.UPLEFT: self.y == 1 and self.x == -1,
-            State.UPRIGHT: self.y == 1 and self.x == 1,
-            State.DOWNLEFT: self.y == -1 and self.x == -1,
-            State.DOWNRIGHT: self.y == -1 and self.x == 1,
-            State.UP: self.y == 1 and self.x == 0,
-            State.DOWN: self.y == -1 and self.x == 0,
-            State.LEFT: self.x == -1 and self.y == 0,
-            State.RIGHT: self.x == 1 and self.y == 0,
-        }
+
+''' Bit of every button in Buttons and InputSnapshot, the order is part of the replay format '''
+BUTTONS = (State.X, State.Y, State.A, State.B, State.R, State.L, State.START, State.SELECT)
+BUTTON_BITS = {button: 1 << i for i, button in enumerate(BUTTONS)}
 
 
 class Buttons(object):
+    '''
+    Held buttons as a bitmask. Presses are also latched in `taps` until the
+    next snapshot, so a press and release within one frame is not lost.
+    '''
+
     def __init__(self):
-        self.states = {
-            State.X: 0,
-            State.Y: 0,
-            State.A: 0,
-            State.B: 0,
-            State.R: 0,
-            State.L: 0,
-            State.START: 0,
-            State.SELECT: 0
-        }
+        self.bits: int = 0
+        self.taps: int = 0
 
     def reset(self) -> None:
-        for item in self.states:
-            self.states[item] = 0
+        self.bits = 0
+        self.taps = 0
 
     def get_pressed(self) -> Optional[str]:
-        for state, value in self.states.items():
-            if value == 1:
-                return state
+        for button in BUTTONS:
+            if self.bits & BUTTON_BITS[button]:
+                return button
 
     def pressed(self, button: str) -> None:
-        if button in self.states:
-            self.states[button] = 1
+        bit = BUTTON_BITS.get(button, 0)
+        self.bits |= bit
+        self.taps |= bit
 
     def released(self, button: str) -> None:
-        if button in self.states:
-            self.states[button] = 0
+        self.bits &= ~BUTTON_BITS.get(button, 0)
 
     def is_pressed(self, button: str) -> bool:
-        if button in self.states:
-            return self.states[button] == 1
-        return False
+        return self.bits & BUTTON_BITS.get(button, 0) != 0
 
     def is_released(self, button: str) -> bool:
-        if button in self.states:
-            return self.states[button] == 0
-        return False
+        return button in BUTTON_BITS and self.bits & BUTTON_BITS[button] == 0
+
+
+class InputSnapshot(int):
+    '''
+    Immutable input of one tick packed in an int: direction x and y shifted
+    to 0..2 in bits 0-3, then one byte each of held, pressed this tick and
+    released this tick buttons. The low 12 bits are the device state, the
+    edges are derived from the previous snapshot.
+    '''
+    __slots__ = ()
+    HELD = 4
+    PRESSED = 12
+    RELEASED = 20
+    STATE_MASK = 0xFFF
+
+    @classmethod
+    def build(cls, x: int, y: int, held: int, previous: int = 0) -> 'InputSnapshot':
+        before = (previous >> cls.HELD) & 0xFF
+        return cls((x + 1) | ((y + 1) << 2) | (held << cls.HELD)
+                   | ((held & ~before) << cls.PRESSED) | ((before & ~held) << cls.RELEASED))
+
+    @property
+    def x(self) -> int:
+        return (self & 3) - 1
+
+    @property
+    def y(self) -> int:
+        return ((self >> 2) & 3) - 1
+
+    def direction(self) -> State:
+        return Direction.STATES[(self.x, self.y)]
+
+    def held(self, button: State) -> bool:
+        return self & (BUTTON_BITS[button] << self.HELD) != 0
+
+    def pressed(self, button: State) -> bool:
+        return self & (BUTTON_BITS[button] << self.PRESSED) != 0
+
+    def released(self, button: State) -> bool:
+        return self & (BUTTON_BITS[button] << self.RELEASED) != 0
+
+
+IDLE_INPUT: InputSnapshot = InputSnapshot.build(0, 0, 0)
 
 
 class UserInput(object):
@@ -143,31 +179,24 @@ class Input(object):
     def get_user_input(self) -> UserInput:
         raise NotImplementedError("Implement `get_user_input` method.")
 
+    def snapshot(self, previous: InputSnapshot = IDLE_INPUT) -> InputSnapshot:
+        ''' Capture the input of this tick, edges are relative to `previous` '''
+        direction = self.get_direction()
+        buttons = self.get_buttons()
+        held = buttons.bits | buttons.taps
+        buttons.taps = 0
+        return InputSnapshot.build(direction.x, direction.y, held, previous)
+
+
+class VirtualInput(Input):
+    '''
+    Input that is driven from code instead of a device, used when the
+    engine runs headless.
+    '''
 
-class Gamepad(Input):
     def __init__(self):
-        self.joystick = None
-        self.joystick_name = None
-        self.hats = []
         self.direction = Direction()
         self.buttons = Buttons()
-        self.button_maps = {
-            12: State.X,
-            13: State.A,
-            14: State.B,
-            15: State.Y,
-            10: State.L,
-            11: State.R,
-            0: State.SELECT,
-            3: State.START
-        }
-        if get_count() > 0:
-            joystick = Joystick(0)
-            joystick.init()
-            self.joystick = joystick
-            self.joystick_name = joystick.get_name()
-            self.hats = joystick.get_numhats()
-            self.axis = joystick.get_numaxes()
 
     def key_down(self, e: Event) -> None:
         pass
@@ -176,25 +205,86 @@ class Gamepad(Input):
         pass
 
     def on_event(self) -> None:
-        for i in range(self.hats):
-            hat = self.joystick.get_hat(i)
-            x = hat[0]
-            y = hat[1]
-            self.direction.update(x, y)
-
-        jx = self.joystick.get_axis(0)
-        jy = self.joystick.get_axis(1)
-        x = int(round(jx, 0))
-        y = int(round(jy, 0))
-        self.direction.update(x, y)
+        pass
 
-        buttons = self.joystick.get_numbuttons()
-        for b in range(buttons):
-            button = self.joystick.get_button(b)
-            if button == 1:
-                self.buttons.pressed(self.button_maps.get(b))
-            else:
-                self.buttons.released(self.button_maps.get(b))
+    def get_direction(self) -> Direction:
+        return self.direction
+
+    def get_buttons(self) -> Buttons:
+        return self.buttons
+
+    def get_user_input(self) -> UserInput:
+        return UserInput(self.direction, self.buttons)
+
+
+class Gamepad(Input):
+    '''
+    Joystick driven by its pygame events, nothing is polled per frame. The
+    hat wins over the left stick when both are pushed.
+    '''
+    DEAD_ZONE = 0.5  # Stick travel ignored around the center, from 0 to 1
+    DEFAULT_BUTTON_MAP = {
+        12: State.X,
+        13: State.A,
+        14: State.B,
+        15: State.Y,
+        10: State.L,
+        11: State.R,
+        0: State.SELECT,
+        3: State.START
+    }
+    ''' Button maps by joystick name, pads not listed use the default map '''
+    BUTTON_MAPS: dict = {}
+
+    def __init__(self, joystick: Joystick, dead_zone: float = DEAD_ZONE):
+        self.joystick = joystick
+        self.joystick_name = joystick.get_name()
+        self.instance_id: int = joystick.get_instance_id()
+        self.dead_zone: float = dead_zone
+        self.button_maps: dict = self.BUTTON_MAPS.get(self.joystick_name, self.DEFAULT_BUTTON_MAP)
+        self.direction = Direction()
+        self.buttons = Buttons()
+        self.__hat: tuple = (0, 0)
+        self.__stick: list = [0, 0]
+
+    def key_down(self, e: Event) -> None:
+        pass
+
+    def key_up(self, e: Event) -> None:
+        pass
+
+    def on_event(self) -> None:
+        pass
+
+    def on_device_event(self, e: Event) -> bool:
+        ''' Apply a joystick event, returns True when the pad is being used '''
+        if e.type == JOYBUTTONDOWN:
+            self.buttons.pressed(self.button_maps.get(e.button))
+            return True
+        if e.type == JOYBUTTONUP:
+            self.buttons.released(self.button_maps.get(e.button))
+        elif e.type == JOYHATMOTION and e.hat == 0:
+            self.__hat = (e.value[0], -e.value[1])  # Hat y is 1 for up, the craft moves up on -1
+            self.__update_direction()
+        elif e.type == JOYAXISMOTION and e.axis < 2:
+            self.__stick[e.axis] = self.__axis(e.value)
+            self.__update_direction()
+        return self.direction.is_idle() is False
+
+    def release(self) -> None:
+        self.buttons.reset()
+        self.direction.update(0, 0)
+
+    def __axis(self, value: float) -> int:
+        if abs(value) < self.dead_zone:
+            return 0
+        return 1 if value > 0 else -1
+
+    def __update_direction(self) -> None:
+        if self.__hat != (0, 0):
+            self.direction.update(*self.__hat)
+        else:
+            self.direction.update(*self.__stick)
 
     def get_direction(self) -> Direction:
         return self.direction
@@ -265,20 +355,51 @@ class Keyboard(Input):
 
 
 class Controller(Input):
+    '''
+    Keyboard plus any number of gamepads, plugged in or out while the game
+    runs. The device that was used last is the active one.
+    '''
+    DEVICE_EVENTS = (JOYBUTTONDOWN, JOYBUTTONUP, JOYHATMOTION, JOYAXISMOTION, JOYDEVICEADDED, JOYDEVICEREMOVED)
+
+    def __init__(self, dead_zone: float = Gamepad.DEAD_ZONE):
+        self.dead_zone: float = dead_zone
+        self.keyboard = Keyboard()
+        self.gamepads: dict = {}  # By joystick instance id
+        self.input: Input = self.keyboard
+        self.user_input = UserInput(self.get_direction(), self.get_buttons())
 
-    def __init__(self):
-        keyboard = Keyboard()
-        gamepad = Gamepad()
-        if gamepad.joystick is None:
-            gamepad = None
-        self.input = gamepad or keyboard
+    def probe(self) -> None:
+        ''' Start the joystick subsystem, SDL then sends JOYDEVICEADDED for every connected pad '''
+        pygame.joystick.init()
+
+    def on_device_event(self, e: Event) -> None:
+        if e.type == JOYDEVICEADDED:
+            gamepad = Gamepad(Joystick(e.device_index), self.dead_zone)
+            self.gamepads[gamepad.instance_id] = gamepad
+            self.__use(gamepad)
+            return
+        gamepad = self.gamepads.get(e.instance_id)
+        if gamepad is None:
+            return
+        if e.type == JOYDEVICEREMOVED:
+            del self.gamepads[e.instance_id]
+            gamepad.release()
+            if self.input is gamepad:
+                self.__use(self.keyboard)
+        elif gamepad.on_device_event(e) is True and self.input is not gamepad:
+            self.__use(gamepad)
+
+    def __use(self, input: Input) -> None:
+        self.input = input
         self.user_input = UserInput(self.get_direction(), self.get_buttons())
 
     def key_down(self, e: Event) -> None:
+        if self.input is not self.keyboard:
+            self.__use(self.keyboard)
         self.input.key_down(e)
 
     def key_up(self, e: Event) -> None:
-        self.input.key_up(e)
+        self.keyboard.key_up(e)
 
     def on_event(self) -> None:
         self.input.on_event()
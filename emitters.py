@@ -0,0 +1,159 @@
+import numpy as np
+from math import atan2, pi
+from pygame import Rect, Surface, SRCALPHA, image, surfarray
+from asset_pack import PACK
+from renderer import Renderer, SpriteRegistry
+from timer import Timer
+
+
+class BulletField(object):
+    '''
+    Enemy bullets stored struct-of-arrays. Positions are bullet centers in
+    backbuffer pixels, velocities are pixels per tick and lifetimes are
+    ticks. Live bullets are always packed in the first `count` slots.
+    '''
+    ORB = Rect(128, 32, 9, 9)  # The only enemy projectile on the bullet sheet, red with a yellow rim
+    ''' Channel order of each skin, the orb recolored once at load into its own image '''
+    SKIN_CHANNELS = (
+        (0, 1, 2),  # Red orb as drawn (0)
+        (2, 1, 0),  # Blue orb with a cyan rim (1)
+        (0, 2, 2),  # All red orb (2)
+    )
+    SKINS = (Rect(0, 0, 9, 9), Rect(9, 0, 9, 9), Rect(18, 0, 9, 9))  # In the skins image, by skin
+    HITBOX = 3  # Half size of the square used against the craft
+    MARGIN = 16  # Bullets are culled once this far outside the backbuffer
+
+    def __init__(self, boundary: tuple, capacity: int = 16384):
+        self.boundary: tuple = boundary
+        self.capacity: int = capacity
+        self.count: int = 0
+        self.dropped: int = 0
+        self.pos = np.zeros((capacity, 2), dtype=np.float32)
+        self.vel = np.zeros((capacity, 2), dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.int32)
+        self.skin = np.zeros(capacity, dtype=np.int16)
+        ''' Per skin lookup tables for drawing '''
+        self.__srcs = np.empty(len(self.SKINS), dtype=object)
+        for i, src in enumerate(self.SKINS):
+            self.__srcs[i] = tuple(src)
+        self.__offsets = np.array([(src.w // 2, src.h // 2) for src in self.SKINS], dtype=np.float32)
+
+    @classmethod
+    def build_skins(cls, filepath: str) -> Surface:
+        ''' Image of all skins side by side, to register as SpriteRegistry.ENEMY_BULLET '''
+        sheet = PACK.image(filepath)
+        if sheet is None:
+            sheet = image.load(filepath)
+        surface = Surface((cls.ORB.w * len(cls.SKIN_CHANNELS), cls.ORB.h), SRCALPHA)
+        surface.fill((0, 0, 0, 0))
+        for skin in cls.SKINS:
+            surface.blit(sheet, skin, cls.ORB)
+        pixels = surfarray.pixels3d(surface)
+        for skin, channels in zip(cls.SKINS, cls.SKIN_CHANNELS):
+            region = pixels[skin.left:skin.right, skin.top:skin.bottom]
+            region[...] = region[:, :, list(channels)]
+        del pixels, region
+        return surface
+
+    def emit(self, x: float, y: float, angles: np.ndarray, speed: float, skin: int = 0, life: int = 300) -> int:
+        ''' Spawn one bullet per angle (radians), returns how many fitted in the field '''
+        n = min(len(angles), self.capacity - self.count)
+        self.dropped += len(angles) - n
+        if n <= 0:
+            return 0
+        s = slice(self.count, self.count + n)
+        angles = angles[:n]
+        self.pos[s] = (x, y)
+        self.vel[s, 0] = np.cos(angles) * speed
+        self.vel[s, 1] = np.sin(angles) * speed
+        self.life[s] = life
+        self.skin[s] = skin
+        self.count += n
+        return n
+
+    def radial(self, x: float, y: float, count: int, speed: float, offset: float = 0.0, skin: int = 0) -> int:
+        angles = offset + np.arange(count, dtype=np.float32) * (2 * pi / count)
+        return self.emit(x, y, angles, speed, skin)
+
+    def aimed_fan(self, x: float, y: float, target: tuple, count: int, spread: float, speed: float,
+                  skin: int = 0) -> int:
+        aim = atan2(target[1] - y, target[0] - x)
+        angles = aim + np.linspace(-spread / 2, spread / 2, count, dtype=np.float32)
+        return self.emit(x, y, angles, speed, skin)
+
+    def update(self, time: int) -> None:
+        n = self.count
+        if n == 0:
+            return
+        pos = self.pos[:n]
+        pos += self.vel[:n]
+        life = self.life[:n]
+        life -= 1
+        m = self.MARGIN
+        keep = (life > 0) \
+            & (pos[:, 0] > -m) & (pos[:, 0] < self.boundary[0] + m) \
+            & (pos[:, 1] > -m) & (pos[:, 1] < self.boundary[1] + m)
+        if keep.all():
+            return
+        ''' Compact the survivors to the front of the arrays '''
+        index = np.flatnonzero(keep)
+        count = len(index)
+        self.pos[:count] = pos[index]
+        self.vel[:count] = self.vel[index]
+        self.life[:count] = life[index]
+        self.skin[:count] = self.skin[index]
+        self.count = count
+
+    def collide(self, rect: Rect) -> bool:
+        ''' Test every bullet against the rect, bullets that hit are spent '''
+        n = self.count
+        if n == 0:
+            return False
+        pos = self.pos[:n]
+        h = self.HITBOX
+        hit = (pos[:, 0] + h > rect.left) & (pos[:, 0] - h < rect.right) \
+            & (pos[:, 1] + h > rect.top) & (pos[:, 1] - h < rect.bottom)
+        if not hit.any():
+            return False
+        ''' Culled on the next update '''
+        self.life[:n][hit] = 0
+        return True
+
+    def draw(self, renderer: Renderer) -> None:
+        n = self.count
+        if n == 0:
+            return
+        skin = self.skin[:n]
+        pos = self.pos[:n]
+        if renderer.alpha < 1.0:
+            pos = pos - self.vel[:n] * (1.0 - renderer.alpha)
+        dests = (pos - self.__offsets[skin]).astype(np.int32).tolist()
+        renderer.draw_batch(SpriteRegistry.ENEMY_BULLET, self.__srcs[skin].tolist(), dests)
+
+
+class Emitter(object):
+    ''' Fires a bullet pattern into a BulletField on a fixed delay '''
+    RADIAL = 0
+    SPIRAL = 1
+    AIMED_FAN = 2
+
+    def __init__(self, pattern: int, delay: int = 1000, count: int = 12, speed: float = 2.0, skin: int = 0):
+        self.pattern: int = pattern
+        self.timer: Timer = Timer(delay)
+        self.count: int = count
+        self.speed: float = speed
+        self.skin: int = skin
+        self.angle: float = 0.0
+
+    def update(self, time: int, field: BulletField, origin: tuple, target: tuple) -> None:
+        if self.timer.looped(time) is False:
+            return
+        x, y = origin
+        if self.pattern == self.RADIAL:
+            field.radial(x, y, self.count, self.speed, 0.0, self.skin)
+        elif self.pattern == self.SPIRAL:
+            ''' A short burst that rotates a bit more on every shot '''
+            field.radial(x, y, self.count, self.speed, self.angle, self.skin)
+            self.angle += pi / (self.count * 2)
+        elif self.pattern == self.AIMED_FAN:
+            field.aimed_fan(x, y, target, self.count, pi / 3, self.speed, self.skin)
@@ -1,19 +1,26 @@
 import pygame
-from pygame.locals import QUIT, KEYUP, KEYDOWN, K_ESCAPE
-from renderer import Renderer
+from pygame.locals import QUIT, KEYUP, KEYDOWN, K_ESCAPE, K_F12
+from renderer import Renderer, use_headless_drivers
 from pygame.time import Clock
 from pygame.event import get, Event
-from controls import Controller, Input
-from pygame import USEREVENT
-from sound_manager import SoundManager
+from controls import Controller, Input, InputSnapshot, IDLE_INPUT
+from sound_manager import SoundManager, MusicPlayer
 from pygame.mouse import set_visible
+from time import perf_counter
+from timer import FixedClock
+from events import BUS
+from startup import TIMELINE
+from tracing import TRACER
 
 
 class GameState(object):
+    ''' Music track played while the state is current, None pauses the music '''
+    music: str = MusicPlayer.MAIN
+
     def __init__(self):
         pass
 
-    def update(self, time: int, input: Input) -> None:
+    def update(self, time: int, input: InputSnapshot) -> None:
         pass
 
     def draw(self, renderer: Renderer) -> None:
@@ -22,22 +29,52 @@ class GameState(object):
     def state(self) -> 'GameState':
         pass
 
-    def on_event(self, e) -> None:
+    def on_event(self, e, sound) -> None:
         pass
 
 
 class Engine():
-    FPS = 30
-    GAME_EVENT = USEREVENT + 1
+    FPS = 30  # Simulation ticks per second
+    TICK_MS = 1000 // FPS  # Time every tick simulates
+    MAX_FPS = 120  # Render cap, presenting with vsync may cap it lower
+    MAX_SKIP = 5  # Ticks simulated before a frame is rendered anyway
 
-    def __init__(self, renderer: Renderer):
+    def __init__(self, renderer: Renderer, headless: bool = False):
         self.__renderer: Renderer = renderer
         self.__run = True
+        self.headless: bool = headless
+        BUS.clear()
+        if headless is True:
+            use_headless_drivers()
+            pygame.display.init()
         self.controller = Controller()
         self.score = 0
         self.sound = SoundManager()
-        self.sound.start_music(-1)
-        set_visible(False)
+        self.started: bool = False
+        ''' Replay Recorder that gets the input and time of every tick '''
+        self.recorder = None
+        self.__input: InputSnapshot = IDLE_INPUT
+        self.max_fps: int = self.MAX_FPS
+        self.max_skip: int = self.MAX_SKIP
+        self.ticks: int = 0
+        self.frames: int = 0
+        self.skipped: int = 0  # Renders skipped to catch up with the simulation
+        self.dropped: int = 0  # Ticks dropped because catching up took more than `max_skip`
+        if headless is False:
+            set_visible(False)
+
+    def start(self, state: GameState) -> None:
+        ''' Bring up what the first frame does not need, called right after it is presented '''
+        TIMELINE.mark('first frame presented')
+        if self.headless is False:
+            with TIMELINE.phase('joystick'):
+                self.controller.probe()
+        self.sound.start()
+        if self.headless is False:
+            with TIMELINE.phase('music'):
+                self.sound.music.follow(state.music)
+        self.started = True
+        TIMELINE.mark('startup complete')
 
     def on_event(self, e: Event) -> None:
         if e.type == QUIT:
@@ -46,14 +83,20 @@ class Engine():
             self.on_key_up(e)
         elif e.type == KEYDOWN:
             self.on_key_down(e)
+        elif e.type in Controller.DEVICE_EVENTS:
+            self.controller.on_device_event(e)
 
     def __cleanup(self) -> None:
+        if self.recorder is not None:
+            self.recorder.close()
         pygame.quit()
 
     def on_exit(self) -> None:
         self.__run = False
 
     def on_key_down(self, e: Event):
+        if e.key == K_F12 and TRACER.enabled is True:
+            print("Trace written to " + TRACER.dump())
         self.controller.key_down(e)
 
     def on_key_up(self, e: Event):
@@ -61,20 +104,101 @@ class Engine():
             self.__run = False
         self.controller.key_up(e)
 
-    def run(self, state: GameState):
+    def run(self, state: GameState, max_frames: int = 0):
+        '''
+        Main loop until the window is closed, or for `max_frames` frames when
+        given. The simulation advances in fixed ticks of TICK_MS whatever the
+        frame rate, then the frame is drawn between the last two ticks. A slow
+        frame runs several ticks before drawing, up to `max_skip`; past that
+        the remaining time is dropped and the game slows down instead.
+        '''
         clock: Clock = Clock()
+        step = 1000 / self.FPS
+        lag: float = step
+        last = perf_counter()
+        frames: int = 0
 
         while(self.__run is True):
-            for event in get():
-                if event.type == self.GAME_EVENT:
-                    state.on_event(event, self.sound)
-                    continue
-                self.on_event(event)
-            self.controller.on_event()
-            state.update(clock.get_time(), self.controller)
+            with TRACER.frame():
+                with TRACER.span('events'):
+                    for event in get():
+                        self.on_event(event)
+                with TRACER.span('Controller.on_event'):
+                    self.controller.on_event()
+                now = perf_counter()
+                lag += (now - last) * 1000
+                last = now
+                ticks: int = 0
+                while lag >= step and ticks < self.max_skip:
+                    self.__update(state, self.TICK_MS, self.controller)
+                    current = state.state()
+                    if current is not state and self.started is True:
+                        self.sound.music.follow(current.music)
+                    state = current
+                    lag -= step
+                    ticks += 1
+                if lag >= step:
+                    self.dropped += int(lag // step)
+                    lag %= step
+                if ticks > 1:
+                    self.skipped += ticks - 1
+                TRACER.counter('ticks per frame', ticks)
+                self.__renderer.alpha = lag / step
+                self.__render(state)
+                self.frames += 1
+                if self.started is False:
+                    self.start(state)
+                with TRACER.span('clock.tick'):
+                    clock.tick(self.max_fps)
+            frames += 1
+            if frames == max_frames:
+                break
+        self.__cleanup()
+
+    def stats(self) -> dict:
+        return {'ticks': self.ticks, 'frames': self.frames, 'skipped': self.skipped, 'dropped': self.dropped}
+
+    def step(self, state: GameState, n_ticks: int, input_source: Input = None, clock: FixedClock = None) -> GameState:
+        '''
+        Advance the given state by `n_ticks` as fast as possible, without
+        sleeping and without reading OS input. Each tick sees the fixed
+        time step of `clock`, by default one frame at `FPS`. Returns the
+        state that is current after the last tick.
+        '''
+        input: Input = self.controller if input_source is None else input_source
+        clock = FixedClock(self.TICK_MS) if clock is None else clock
+        self.__renderer.alpha = 1.0
+        for _ in range(n_ticks):
+            with TRACER.frame():
+                ''' OS events are drained so the queue never fills up '''
+                get()
+                input.on_event()
+                self.__update(state, clock.get_time(), input)
+                self.__render(state)
+                self.frames += 1
+                state = state.state()
+                if self.started is False:
+                    self.start(state)
+                clock.tick(self.FPS)
+        return state
+
+    def __update(self, state: GameState, time: int, input: Input) -> None:
+        ''' The input is captured once per tick, edges are relative to the previous tick '''
+        self.__input = snapshot = input.snapshot(self.__input)
+        if self.recorder is not None:
+            self.recorder.record(time, snapshot)
+        with TRACER.span('state.update'):
+            state.update(time, snapshot)
+        with TRACER.span('events.dispatch'):
+            for event in BUS.dispatch():
+                state.on_event(event, self.sound)
+            self.sound.update(time)
+        self.ticks += 1
+
+    def __render(self, state: GameState) -> None:
+        with TRACER.span('renderer.cls'):
             self.__renderer.cls()
+        with TRACER.span('state.draw'):
             state.draw(self.__renderer)
+        with TRACER.span('draw_to_screen'):
             self.__renderer.draw_to_screen()
-            state = state.state()
-            clock.tick(self.FPS)
-        self.__cleanup()
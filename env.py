@@ -0,0 +1,220 @@
+import sys
+import numpy as np
+from argparse import ArgumentParser
+from multiprocessing import get_context, cpu_count
+from multiprocessing.shared_memory import SharedMemory
+from time import perf_counter
+from pygame import surfarray
+from renderer import OffscreenRenderer, use_headless_drivers
+from engine import Engine
+from controls import VirtualInput, State
+from game import LoadState, GetReadyState, PlayState
+from rng import RNG
+
+
+class GameEnv(object):
+    '''
+    reset()/step(action) wrapper around PlayState for automated play-testing
+    and agents. An action is an index in ACTIONS, a direction plus whether
+    fire is held, kept for `frame_skip` ticks. Observations are RGB arrays
+    of the backbuffer, (height, width, 3) uint8, keeping every `downsample`
+    -th pixel. The reward is the score gained, an episode ends when the
+    craft is destroyed or after `max_ticks` when it is above 0.
+
+    The game keeps its pools, random streams and event bus in module
+    singletons, so instances in one process share them. VectorEnv runs
+    them in separate processes.
+    '''
+    WIDTH = 320
+    HEIGHT = 240
+    ACTIONS = tuple((x, y, fire) for fire in (False, True) for y in (-1, 0, 1) for x in (-1, 0, 1))
+
+    def __init__(self, frame_skip: int = 1, downsample: int = 1, max_ticks: int = 0):
+        use_headless_drivers()
+        self.frame_skip: int = frame_skip
+        self.downsample: int = downsample
+        self.max_ticks: int = max_ticks
+        self.renderer: OffscreenRenderer = OffscreenRenderer(self.WIDTH, self.HEIGHT, self.WIDTH, self.HEIGHT)
+        self.engine: Engine = Engine(self.renderer, headless=True)
+        self.input: VirtualInput = VirtualInput()
+        self.state: PlayState = None
+        self.ticks: int = 0
+
+    @classmethod
+    def observation_shape(cls, downsample: int = 1) -> tuple:
+        return (len(range(0, cls.HEIGHT, downsample)), len(range(0, cls.WIDTH, downsample)), 3)
+
+    def reset(self, seed: int = None, out: np.ndarray = None) -> np.ndarray:
+        ''' Start a new episode, the random streams are only reseeded when a seed is given '''
+        if seed is not None:
+            RNG.seed(seed)
+        self.input.direction.update(0, 0)
+        self.input.buttons.reset()
+        self.state = PlayState(GetReadyState(LoadState(self.renderer)), 0)
+        self.ticks = 0
+        self.engine.step(self.state, 1, self.input)
+        return self.observe(out)
+
+    def step(self, action: int, out: np.ndarray = None) -> tuple:
+        ''' Returns (observation, reward, done, info) '''
+        x, y, fire = self.ACTIONS[action]
+        self.input.direction.update(x, y)
+        if fire is True:
+            self.input.buttons.pressed(State.X)
+        else:
+            self.input.buttons.released(State.X)
+        score = self.state.score
+        self.engine.step(self.state, self.frame_skip, self.input)
+        self.ticks += self.frame_skip
+        done = self.state.craft.is_alive() is False or (self.max_ticks > 0 and self.ticks >= self.max_ticks)
+        info = {'score': self.state.score, 'ticks': self.ticks}
+        return self.observe(out), self.state.score - score, done, info
+
+    def observe(self, out: np.ndarray = None) -> np.ndarray:
+        '''
+        Read the backbuffer through a surfarray view, into `out` when given.
+        The view locks the surface, it is released before anything else draws.
+        '''
+        view = surfarray.pixels3d(self.renderer.backbuffer)
+        frame = view.transpose(1, 0, 2)[::self.downsample, ::self.downsample]
+        if out is None:
+            out = frame.copy()
+        else:
+            np.copyto(out, frame)
+        del frame, view
+        return out
+
+
+def run_worker(pipe, memory_name: str, shape: tuple, first: int, count: int,
+               frame_skip: int, downsample: int, max_ticks: int) -> None:
+    '''
+    Hosts instances `first` to `first + count` of a VectorEnv and writes
+    their observations straight into the shared block.
+    '''
+    memory = SharedMemory(name=memory_name)
+    observations = np.ndarray(shape, dtype=np.uint8, buffer=memory.buf)[first:first + count]
+    envs = [GameEnv(frame_skip, downsample, max_ticks) for _ in range(count)]
+    try:
+        while True:
+            command, data = pipe.recv()
+            if command == 'reset':
+                for i, env in enumerate(envs):
+                    env.reset(data if i == 0 else None, observations[i])
+                pipe.send(None)
+            elif command == 'step':
+                rewards, dones, infos = [], [], []
+                for i, env in enumerate(envs):
+                    _, reward, done, info = env.step(data[i], observations[i])
+                    if done is True:
+                        ''' The observation of a finished episode is the first one of the next '''
+                        env.reset(None, observations[i])
+                    rewards.append(reward)
+                    dones.append(done)
+                    infos.append(info)
+                pipe.send((rewards, dones, infos))
+            else:
+                break
+    finally:
+        del observations
+        memory.close()
+        pipe.close()
+
+
+class VectorEnv(object):
+    '''
+    `n` GameEnvs sharded across worker processes. Workers write observations
+    into one shared memory array of shape (n, height, width, 3), so frames
+    are never pickled, only actions, rewards and flags go through the pipes.
+    `observations` is that array, valid until the next step. Finished
+    instances reset right away and report done once.
+    '''
+
+    def __init__(self, n: int, seed: int = None, frame_skip: int = 1, downsample: int = 1,
+                 max_ticks: int = 0, workers: int = 0):
+        self.n: int = n
+        self.seed: int = seed
+        workers = min(n, workers if workers > 0 else cpu_count())
+        shape = (n,) + GameEnv.observation_shape(downsample)
+        self.__memory = SharedMemory(create=True, size=int(np.prod(shape)))
+        self.observations = np.ndarray(shape, dtype=np.uint8, buffer=self.__memory.buf)
+        context = get_context('spawn')
+        self.__pipes: list = []
+        self.__processes: list = []
+        self.__shards: list = []
+        for w in range(workers):
+            first, last = n * w // workers, n * (w + 1) // workers
+            pipe, child = context.Pipe()
+            process = context.Process(target=run_worker, daemon=True, args=(
+                child, self.__memory.name, shape, first, last - first, frame_skip, downsample, max_ticks))
+            process.start()
+            child.close()
+            self.__pipes.append(pipe)
+            self.__processes.append(process)
+            self.__shards.append((first, last))
+
+    def reset(self) -> np.ndarray:
+        ''' Each worker seeds its streams with `seed` plus its index, runs replay when seeded '''
+        for w, pipe in enumerate(self.__pipes):
+            pipe.send(('reset', None if self.seed is None else self.seed + w))
+        for pipe in self.__pipes:
+            pipe.recv()
+        return self.observations
+
+    def step(self, actions) -> tuple:
+        ''' Returns (observations, rewards, dones, infos) for all instances '''
+        actions = [int(action) for action in actions]
+        for pipe, (first, last) in zip(self.__pipes, self.__shards):
+            pipe.send(('step', actions[first:last]))
+        rewards, dones, infos = [], [], []
+        for pipe in self.__pipes:
+            shard_rewards, shard_dones, shard_infos = pipe.recv()
+            rewards += shard_rewards
+            dones += shard_dones
+            infos += shard_infos
+        return self.observations, np.array(rewards, dtype=np.float32), np.array(dones, dtype=bool), infos
+
+    def close(self) -> None:
+        for pipe in self.__pipes:
+            pipe.send(('close', None))
+        for process in self.__processes:
+            process.join()
+        self.__pipes = []
+        self.__processes = []
+        del self.observations
+        self.__memory.close()
+        self.__memory.unlink()
+
+    def __enter__(self) -> 'VectorEnv':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def main() -> int:
+    parser = ArgumentParser(description="Measure VectorEnv throughput with random actions")
+    parser.add_argument("--instances", type=int, default=cpu_count(), help="game instances (default: one per core)")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (default: one per core)")
+    parser.add_argument("--steps", type=int, default=1000, help="vector steps to time")
+    parser.add_argument("--frame-skip", type=int, default=1, help="ticks per step")
+    parser.add_argument("--downsample", type=int, default=1, help="keep every n-th pixel of the observations")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    actions = np.random.default_rng(args.seed)
+    with VectorEnv(args.instances, args.seed, args.frame_skip, args.downsample, workers=args.workers) as env:
+        env.reset()
+        episodes = 0
+        start = perf_counter()
+        for _ in range(args.steps):
+            _, _, dones, _ = env.step(actions.integers(0, len(GameEnv.ACTIONS), args.instances))
+            episodes += int(dones.sum())
+        elapsed = perf_counter() - start
+    steps = args.steps * args.instances
+    print("{} instances, {} steps in {:.2f}s: {:.0f} steps/s, {:.0f} ticks/s, {} episodes ended".format(
+        args.instances, steps, elapsed, steps / elapsed, steps * args.frame_skip / elapsed, episodes))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+from typing import NamedTuple
+
+
+class GameEvent:
+    CRAFT_SHOOTED = 0
+    ENEMY_DESTROYED = 1
+    PLAYER_DESTROYED = 2
+
+    NAMES = ('CRAFT_SHOOTED', 'ENEMY_DESTROYED', 'PLAYER_DESTROYED')
+
+
+class BusEvent(NamedTuple):
+    ''' Every event of one type published during a frame, merged into one '''
+    gtype: int
+    count: int = 1
+    points: int = 0
+
+
+class EventBus(object):
+    '''
+    In-process queue for game events. Publishing only bumps per type
+    counters, so it never allocates and never fills up. Once per frame
+    `dispatch` merges what was published into one BusEvent per type, with
+    the points summed, and hands them to the subscribers.
+    '''
+
+    def __init__(self):
+        size = len(GameEvent.NAMES)
+        self.subscribers: dict = {}
+        self.__counts: list = [0] * size
+        self.__points: list = [0] * size
+        ''' How many events of each type the last dispatched frame had '''
+        self.counts: tuple = (0,) * size
+
+    def subscribe(self, gtype: int, callback) -> None:
+        self.subscribers.setdefault(gtype, []).append(callback)
+
+    def unsubscribe(self, gtype: int, callback) -> None:
+        self.subscribers[gtype].remove(callback)
+
+    def publish(self, gtype: int, points: int = 0) -> None:
+        self.__counts[gtype] += 1
+        self.__points[gtype] += points
+
+    def dispatch(self) -> list:
+        ''' Deliver the merged events of the frame in type order and return them '''
+        self.counts = tuple(self.__counts)
+        events: list = []
+        for gtype, count in enumerate(self.counts):
+            if count == 0:
+                continue
+            event = BusEvent(gtype, count, self.__points[gtype])
+            self.__counts[gtype] = 0
+            self.__points[gtype] = 0
+            events.append(event)
+            for callback in self.subscribers.get(gtype, ()):
+                callback(event)
+        return events
+
+    def clear(self) -> None:
+        ''' Drop pending events, subscribers are kept '''
+        size = len(GameEvent.NAMES)
+        self.__counts = [0] * size
+        self.__points = [0] * size
+        self.counts = (0,) * size
+
+    def stats(self) -> dict:
+        return {name: count for name, count in zip(GameEvent.NAMES, self.counts)}
+
+
+BUS: EventBus = EventBus()
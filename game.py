@@ -1,50 +1,66 @@
 from engine import GameState
 from renderer import Renderer, SpriteRegistry
-from sprites import Background, Craft, AsteroidWave, FontSprite, PowerUp, GameEvent
-from controls import Input
+from sprites import Background, Craft, Asteroid, AsteroidWave, FontSprite, PowerUp, CollisionGroup
+from events import GameEvent, BusEvent
+from collision import SpatialHash, MASKS
+from emitters import BulletField
+from tracing import TRACER
+from controls import InputSnapshot
 from pygame import Rect
-from pygame.event import Event
-from random import randint
+from rng import RNG
 from sound_manager import SoundManager  
 
+DROP_RNG = RNG.get('drops')
+
+
 class BaseState(GameState):
     def __init__(self, score: int = 0):
         self.score: int = score
         self.font: FontSprite = FontSprite()
+        self.__shown_score: int = -1
 
-    def on_event(self, e: Event, sound: SoundManager) -> None:
+    def on_event(self, e: BusEvent, sound: SoundManager) -> None:
         if e.gtype == GameEvent.CRAFT_SHOOTED:
-            sound.play(SoundManager.FIRE)  # Play sound
+            sound.play(SoundManager.FIRE, e.count)  # Play sound
         elif e.gtype == GameEvent.ENEMY_DESTROYED:
             ''' play sound, increase score '''
-            sound.play(SoundManager.EXPLODE)
+            sound.play(SoundManager.EXPLODE, e.count)
             self.score += e.points
         elif e.gtype == GameEvent.PLAYER_DESTROYED:
-            sound.play(SoundManager.PLAYER_EXPLODE)
+            sound.play(SoundManager.PLAYER_EXPLODE, e.count)
 
     def draw_score(self, renderer: Renderer) -> None:
-        word = str(self.score)
-        word = word.zfill(8)
-        self.font.display(word)
+        if self.score != self.__shown_score:
+            self.__shown_score = self.score
+            self.font.display(str(self.score).zfill(8))
         self.font.draw(renderer)
 
 
 class LoadState(BaseState):
+    IMAGES = (
+        (SpriteRegistry.BACKGROUND, "assets/background.png"),
+        (SpriteRegistry.CRAFT, "assets/pxplayer.png"),
+        (SpriteRegistry.BULLET, "assets/bullets.png"),
+        (SpriteRegistry.ASTEROID, "assets/level1_sprites.png"),
+        (SpriteRegistry.EXPLOSION, "assets/explosion.png"),
+        (SpriteRegistry.FONTS, "assets/font.png"),
+        (SpriteRegistry.POWERUP, "assets/power-up.png"),
+    )
 
     def __init__(self, renderer: Renderer):
         super().__init__()
         self.renderer: Renderer = renderer
-        self.renderer.register_image(SpriteRegistry.BACKGROUND, "assets/background.png")
-        self.renderer.register_image(SpriteRegistry.CRAFT, "assets/pxplayer.png")
-        self.renderer.register_image(SpriteRegistry.BULLET, "assets/bullets.png")
-        self.renderer.register_image(SpriteRegistry.ASTEROID, "assets/level1_sprites.png")
-        self.renderer.register_image(SpriteRegistry.EXPLOSION, "assets/explosion.png")
-        self.renderer.register_image(SpriteRegistry.FONTS, "assets/font.png")
-        self.renderer.register_image(SpriteRegistry.POWERUP, "assets/power-up.png")
+        for spr, filepath in self.IMAGES:
+            self.renderer.register_image(spr, filepath)
+        paths = dict(self.IMAGES)
+        self.renderer.register_surface(SpriteRegistry.ENEMY_BULLET, BulletField.build_skins(paths[SpriteRegistry.BULLET]))
+        ''' Only the irregular sprites collide per pixel '''
+        MASKS.build(SpriteRegistry.ASTEROID, paths[SpriteRegistry.ASTEROID], Asteroid.VARIANTS)
+        MASKS.build(SpriteRegistry.CRAFT, paths[SpriteRegistry.CRAFT], Craft.frames())
         self.background: Background = Background()
         self.craft: Craft = Craft(renderer.bb_size)
 
-    def update(self, time: int, input: Input) -> None:
+    def update(self, time: int, input: InputSnapshot) -> None:
         pass
 
     def draw(self, renderer: Renderer) -> None:
@@ -62,7 +78,7 @@ class GetReadyState(BaseState):
         self.background: Background = state.background
         self.craft: Craft = Craft(self.renderer.bb_size)
 
-    def update(self, time: int, input: Input) -> None:
+    def update(self, time: int, input: InputSnapshot) -> None:
         self.background.update(time)
         self.craft.set_input(input)
         self.craft.update(time)
@@ -87,21 +103,47 @@ class PlayState(BaseState):
         self.background: Background = state.background
         self.craft: Craft = state.craft
         self.asteroids: AsteroidWave = AsteroidWave(self.renderer.bb_size)
+        self.asteroids.target = self.craft.rect
         self.__dead_tick: int = 0
         self.__powerups: list = []
-
-    def update(self, time: int, input: Input) -> None:
-        self.background.update(time)
-        self.craft.set_input(input)
-        self.craft.update(time)
-        self.asteroids.update(time)
-        self.check_collision()
-        [powerup.update(time) for powerup in self.__powerups]
+        self.__grid: SpatialHash = SpatialHash(self.renderer.bb_size)
+
+    def update(self, time: int, input: InputSnapshot) -> None:
+        with TRACER.span('Background.update'):
+            self.background.update(time)
+        with TRACER.span('Craft.update'):
+            self.craft.set_input(input)
+            self.craft.update(time)
+        with TRACER.span('AsteroidWave.update'):
+            self.asteroids.update(time)
+        with TRACER.span('collision'):
+            self.check_collision()
+        self.update_powerups(time)
+        if TRACER.enabled is True:
+            TRACER.counter('asteroids', len(self.asteroids.items))
+            TRACER.counter('craft bullets', len(self.craft.bullets))
+            TRACER.counter('enemy bullets', self.asteroids.bullets.count)
+
+    @property
+    def powerups(self) -> list:
+        return self.__powerups
+
+    def update_powerups(self, time: int) -> None:
+        ''' Power-ups that drift off the left edge uncollected are dropped '''
+        live: list = []
+        for powerup in self.__powerups:
+            powerup.update(time)
+            if powerup.rect.right >= 0:
+                live.append(powerup)
+        self.__powerups = live
 
     def draw(self, renderer: Renderer) -> None:
-        self.background.draw(renderer)
-        self.asteroids.draw(renderer)
-        self.craft.draw(renderer)
+        with TRACER.span('Background.draw'):
+            self.background.draw(renderer)
+        with TRACER.span('AsteroidWave.draw'):
+            self.asteroids.draw(renderer)
+        with TRACER.span('Craft.draw'):
+            self.craft.draw(renderer)
         self.draw_score(renderer)
         [powerup.draw(renderer) for powerup in self.__powerups]
 
@@ -113,14 +155,22 @@ class PlayState(BaseState):
         return self
 
     def check_collision(self) -> None:
-        items = self.asteroids.collide(self.craft)
+        ''' Rebuild the broadphase grid once per tick and share it between the checks '''
+        grid = self.__grid
+        grid.clear()
+        self.craft.broadphase(grid)
+        items = self.asteroids.collide(self.craft, grid)
         for item in items:
-            if randint(1, 5) == 3:
+            if DROP_RNG.randint(1, 5) == 3:
                 powerup = PowerUp()
                 powerup.rect.center = item.rect.center
                 self.__powerups.append(powerup)
+        collected: list = []
         for p in self.__powerups:
-            if p.collide(self.craft):
-                p.destroy()
-                self.__powerups.remove(p)
-                self.craft.power_up(p.skin)
+            for craft in grid.query(p.rect, CollisionGroup.CRAFT):
+                if p.collide(craft):
+                    p.destroy()
+                    collected.append(p)
+                    craft.power_up(p.skin)
+        if len(collected) > 0:
+            self.__powerups = [p for p in self.__powerups if p.is_alive()]
@@ -1,12 +1,114 @@
+from startup import TIMELINE
+from argparse import ArgumentParser
+from hashlib import md5
+from time import perf_counter
+from pygame import image
 from engine import Engine
-from renderer import SdlRenderer
+from renderer import SdlRenderer, TextureRenderer, create_renderer, use_headless_drivers
+from controls import VirtualInput
 from game import LoadState
+from tracing import TRACER
+from rng import RNG
+from replay import Recorder, Replay
+from capture import FrameCapture
+
+TIMELINE.mark('imports')
 
 
 def main():
-    renderer = SdlRenderer(320, 240, 800, 600)
+    parser = ArgumentParser(description="Project-X clone")
+    parser.add_argument("--headless", type=int, metavar="TICKS", default=0,
+                        help="run TICKS simulation ticks without a display and report ticks per second")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="only redraw and present the parts of the screen that changed, implies --software")
+    parser.add_argument("--software", action="store_true",
+                        help="scale and present with the CPU instead of an SDL2 texture")
+    parser.add_argument("--scaling", default=TextureRenderer.INTEGER,
+                        choices=[TextureRenderer.INTEGER, TextureRenderer.NEAREST, TextureRenderer.SMOOTH],
+                        help="how the texture renderer fits the backbuffer in the window (default integer)")
+    parser.add_argument("--no-vsync", action="store_true", help="present without waiting for the vertical sync")
+    parser.add_argument("--max-fps", type=int, default=Engine.MAX_FPS,
+                        help="render at most this many frames per second, 0 for no cap (default {}). The "
+                             "simulation always runs at {} ticks per second".format(Engine.MAX_FPS, Engine.FPS))
+    parser.add_argument("--profile-startup", nargs="?", const="", metavar="PATH",
+                        help="start the game, print the startup timeline after the first frame and exit, "
+                             "PATH also writes it as JSON")
+    parser.add_argument("--trace", nargs="?", type=float, const=100.0, metavar="SPIKE_MS",
+                        help="record frame phases, F12 writes a Chrome trace and so does any frame slower than "
+                             "SPIKE_MS (default 100, 0 disables). Headless runs write one at the end")
+    parser.add_argument("--seed", type=int, help="seed of the random streams, random when omitted")
+    parser.add_argument("--record", metavar="PATH", help="write the input of every frame to a replay file")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="run a recorded game headless, with its seed, input and frame times")
+    parser.add_argument("--capture", metavar="PATH",
+                        help="record every frame on a background thread, to PATH.y4m, PATH.png (one file per "
+                             "frame) or raw bgr0 pixels for any other name")
+    args = parser.parse_args()
+    if args.trace is not None:
+        TRACER.enable(args.trace)
+    if args.replay is not None:
+        replay = Replay(args.replay)
+        RNG.seed(replay.seed)
+        headless(len(replay), replay, args.capture)
+        if TRACER.enabled is True:
+            print("Trace written to " + TRACER.dump())
+        return
+    RNG.seed(args.seed)
+    if args.headless > 0:
+        headless(args.headless, capture=args.capture)
+        if TRACER.enabled is True:
+            print("Trace written to " + TRACER.dump())
+        return
+    if args.software or args.dirty_rects:
+        renderer = SdlRenderer(320, 240, 800, 600, dirty_rects=args.dirty_rects)
+    else:
+        renderer = create_renderer(320, 240, 800, 600, scaling=args.scaling, vsync=not args.no_vsync)
     engine: Engine = Engine(renderer)
-    engine.run(LoadState(renderer))
+    if args.capture is not None:
+        renderer.capture = FrameCapture(args.capture, renderer.backbuffer, fps=args.max_fps or Engine.FPS)
+    if args.record is not None:
+        engine.recorder = Recorder(args.record, RNG.base)
+    with TIMELINE.phase('LoadState'):
+        state = LoadState(renderer)
+    engine.max_fps = args.max_fps
+    if args.profile_startup is None:
+        engine.run(state)
+        if renderer.capture is not None:
+            close_capture(renderer.capture)
+        if TRACER.enabled is True:
+            print("{ticks} ticks in {frames} frames, {skipped} renders skipped, {dropped} ticks dropped".format(
+                **engine.stats()))
+        return
+    engine.run(state, 1)
+    TIMELINE.report()
+    if args.profile_startup:
+        TIMELINE.export(args.profile_startup)
+
+
+def close_capture(capture: FrameCapture) -> None:
+    capture.close()
+    print("{captured} frames captured, {written} written, {dropped} dropped".format(**capture.stats())
+          + " to " + capture.path)
+
+
+def headless(ticks: int, replay: Replay = None, capture: str = None) -> None:
+    use_headless_drivers()
+    renderer = SdlRenderer(320, 240, 800, 600)
+    if capture is not None:
+        ''' Offline runs wait for the writer, the video keeps every tick '''
+        renderer.capture = FrameCapture(capture, renderer.backbuffer, fps=Engine.FPS, block=True)
+    engine: Engine = Engine(renderer, headless=True)
+    input = VirtualInput() if replay is None else replay.input()
+    clock = None if replay is None else replay.clock()
+    start = perf_counter()
+    state = engine.step(LoadState(renderer), ticks, input, clock)
+    elapsed = perf_counter() - start
+    print("{} ticks in {:.3f}s ({:.0f} ticks/s)".format(ticks, elapsed, ticks / elapsed))
+    ''' Equal digests mean two runs drew the same last frame '''
+    digest = md5(image.tobytes(renderer.backbuffer, 'RGB')).hexdigest()
+    print("seed {}, score {}, last frame {}".format(RNG.base, getattr(state, 'score', 0), digest))
+    if renderer.capture is not None:
+        close_capture(renderer.capture)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,30 @@
+class Pool(object):
+    '''
+    Free list of resettable objects. `acquire` hands out a released
+    instance after calling its `reset` with the given arguments, or builds
+    a new one from the factory when the pool is empty. At most `limit`
+    released items are kept, the rest is left to the garbage collector.
+    '''
+
+    def __init__(self, factory, size: int = 0, limit: int = 2048):
+        self.factory = factory
+        self.limit: int = limit
+        self.free: list = [factory() for _ in range(size)]
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def acquire(self, *args):
+        if len(self.free) > 0:
+            self.hits += 1
+            item = self.free.pop()
+            item.reset(*args)
+            return item
+        self.misses += 1
+        return self.factory(*args)
+
+    def release(self, item) -> None:
+        if len(self.free) < self.limit:
+            self.free.append(item)
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'free': len(self.free)}
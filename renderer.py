@@ -1,7 +1,21 @@
-from pygame import Surface, Rect, image, init, HWSURFACE, DOUBLEBUF, FULLSCREEN
+import os
+from collections import Counter
+from itertools import repeat
+from math import gcd
+from pygame import Surface, Rect, display, image, HWSURFACE, DOUBLEBUF, FULLSCREEN, SRCALPHA, BLEND_PREMULTIPLIED
 from pygame.transform import scale
 from pygame.display import set_mode, update
+from pygame._sdl2.video import Window, Texture, Renderer as VideoRenderer
 from enum import Enum
+from asset_pack import PACK
+from capture import FrameCapture
+from startup import TIMELINE
+
+
+def use_headless_drivers() -> None:
+    ''' Route SDL video and audio to the dummy drivers, must run before any window is created '''
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
 
 
 class SpriteRegistry(Enum):
@@ -12,9 +26,27 @@ class SpriteRegistry(Enum):
     EXPLOSION = 4
     FONTS = 5
     POWERUP = 6
+    ENEMY_BULLET = 7
+
+
+''' Default z-layer of each sprite sheet, lower layers are drawn first. They follow the order PlayState
+draws in: hit explosions over the bullets that caused them and power-ups over the score '''
+LAYERS = {
+    SpriteRegistry.BACKGROUND: 0,
+    SpriteRegistry.ASTEROID: 1,
+    SpriteRegistry.ENEMY_BULLET: 2,
+    SpriteRegistry.CRAFT: 3,
+    SpriteRegistry.BULLET: 4,
+    SpriteRegistry.EXPLOSION: 5,
+    SpriteRegistry.FONTS: 9,
+    SpriteRegistry.POWERUP: 10,
+}
 
 
 class Renderer(object):
+    ''' How far presentation is between the last two simulation ticks, 1 is the latest tick '''
+    alpha: float = 1.0
+
     def __init__(self, bb_width: int, bb_height: int, sc_width: int, sc_height: int, fullscreen: bool = False):
         pass
 
@@ -27,34 +59,395 @@ class Renderer(object):
     def register_image(self, name: int, filepath: str) -> None:
         pass
 
+    def register_surface(self, name: int, surface: Surface) -> None:
+        pass
+
     def draw(self, name: int, src: Rect, dest: Rect) -> None:
         pass
 
+    def draw_batch(self, name: int, srcs: list, dests: list) -> None:
+        pass
+
+    def compose_image(self, name, size: tuple, parts: list, premultiplied: bool = False, layer: int = 0) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+    def lerp(self, previous: tuple, current: tuple) -> tuple:
+        ''' Where to draw an entity that moved from `previous` to `current` in the last tick '''
+        alpha = self.alpha
+        if alpha >= 1.0 or previous is None:
+            return current
+        return (int(round(previous[0] + (current[0] - previous[0]) * alpha)),
+                int(round(previous[1] + (current[1] - previous[1]) * alpha)))
+
 
 class SdlRenderer(Renderer):
-    def __init__(self, bb_width: int, bb_height: int, sc_width: int, sc_height: int, fullscreen: bool = False):
-        init()
+    CLS_COLOR = (21, 21, 21)
+    FULL_REDRAW = 0.5  # Redraw everything once the dirty area exceeds this part of the backbuffer
+
+    def __init__(self, bb_width: int, bb_height: int, sc_width: int, sc_height: int, fullscreen: bool = False,
+                 dirty_rects: bool = False):
+        ''' Only video is needed to draw, the engine starts the other subsystems '''
+        with TIMELINE.phase('display.init'):
+            display.init()
         self.bb_size = (bb_width, bb_height)
-        self.__images: list = []
-        self.__size = (sc_width, sc_height)
+        self.__images: dict = {}
+        self.__premultiplied: dict = {}
+        self.size = (sc_width, sc_height)
+        with TIMELINE.phase('window ' + type(self).__name__):
+            self.create_screen(fullscreen)
+        """ backbuffer Surface for handling the small graphics """
+        self.backbuffer = Surface(self.bb_size)
+        ''' Pixel layout of converted images, packed images are used as is when they match '''
+        self.__format: tuple = self.convert(Surface((1, 1), SRCALPHA)).get_masks()
+        self.__layers: dict = dict(LAYERS)
+        ''' Draw commands of the current frame, one list per (layer, image) in submission order '''
+        self.__queues: dict = {}
+        self.commands: int = 0
+        self.draw_calls: int = 0
+        '''
+        Dirty rectangle mode keeps the backbuffer between frames and only
+        redraws, rescales and presents the regions whose draw commands
+        changed since the previous frame. It only pays off on static
+        screens: while the background scrolls, every frame is a full redraw.
+        '''
+        self.dirty_rects: bool = dirty_rects
+        self.__versions: dict = {}
+        self.__previous: list = []
+        self.__backdrop: list = []
+        self.__full_redraw: bool = True
+        self.__step = (bb_width // gcd(bb_width, sc_width), bb_height // gcd(bb_height, sc_height))
+        self.dirty_count: int = 0
+        self.dirty_area: float = 1.0
+        ''' Set to record every flushed frame '''
+        self.capture: FrameCapture = None
+
+    def create_screen(self, fullscreen: bool) -> None:
         if fullscreen is True:
-            self.__screen = set_mode(self.__size, HWSURFACE | DOUBLEBUF | FULLSCREEN)
+            self.screen = set_mode(self.size, HWSURFACE | DOUBLEBUF | FULLSCREEN)
         else:
-            self.__screen = set_mode(self.__size)
-        """ backbuffer Surface for handling the small graphics """
-        self.__backbuffer = Surface(self.bb_size)
+            self.screen = set_mode(self.size)
+
+    def convert(self, surface: Surface) -> Surface:
+        ''' Convert a loaded image to the pixel format used for fast blits '''
+        return surface.convert_alpha()
 
     def draw_to_screen(self) -> None:
-        self.__backbuffer.convert_alpha()
-        """ upscale backbuffer to screen """
-        scale(self.__backbuffer, self.__size, self.__screen)
-        update()
+        dirty = self.flush()
+        if self.capture is not None:
+            self.capture.grab(self.backbuffer)
+        self.present(dirty)
+
+    def present(self, dirty: list) -> None:
+        ''' Show the flushed backbuffer, `dirty` as returned by flush '''
+        if dirty is None:
+            """ upscale backbuffer to screen """
+            scale(self.backbuffer, self.size, self.screen)
+            update()
+            return
+        screen_rects: list = []
+        for rect in dirty:
+            screen_rect = self.__to_screen(rect)
+            scale(self.backbuffer.subsurface(rect), screen_rect.size, self.screen.subsurface(screen_rect))
+            screen_rects.append(screen_rect)
+        if len(screen_rects) > 0:
+            update(screen_rects)
 
     def cls(self) -> None:
-        self.__backbuffer.fill((21, 21, 21))
+        if self.dirty_rects is True:
+            ''' Dirty regions are cleared when the frame is flushed '''
+            return
+        self.backbuffer.fill(self.CLS_COLOR)
 
     def register_image(self, spr: SpriteRegistry, filepath: str) -> None:
-        self.__images.insert(spr.value, image.load(filepath).convert_alpha())
+        with TIMELINE.phase('image ' + filepath):
+            surface = PACK.image(filepath)
+            if surface is None or surface.get_masks() != self.__format:
+                surface = self.convert(image.load(filepath))
+        self.__images[spr] = surface
+        self.__premultiplied.pop(spr, None)
+
+    def register_surface(self, spr: SpriteRegistry, surface: Surface) -> None:
+        ''' Register an image built in code, it is converted like a loaded one '''
+        self.__versions[spr] = self.__versions.get(spr, 0) + 1
+        self.__images[spr] = self.convert(surface)
+        self.__premultiplied.pop(spr, None)
+
+    def compose_image(self, name, size: tuple, parts: list, premultiplied: bool = False, layer: int = 0) -> None:
+        '''
+        Build a new image under `name` from (spr, src, dest) regions of the
+        registered images, blitted in order onto a transparent surface.
+        A premultiplied image must be drawn with BLEND_PREMULTIPLIED.
+        '''
+        self.__layers[name] = layer
+        self.__versions[name] = self.__versions.get(name, 0) + 1
+        surface = self.convert(Surface(size, SRCALPHA))
+        surface.fill((0, 0, 0, 0))
+        if premultiplied is False:
+            surface.blits([(self.__images[spr], dest, src) for spr, src, dest in parts], doreturn=False)
+        else:
+            sources = self.__premultiplied
+            for spr, _, _ in parts:
+                if spr not in sources:
+                    sources[spr] = self.__images[spr].premul_alpha()
+            surface.blits([(sources[spr], dest, src, BLEND_PREMULTIPLIED) for spr, src, dest in parts], doreturn=False)
+        self.__images[name] = surface
+        self.__premultiplied.pop(name, None)
 
     def draw(self, spr: SpriteRegistry, src: Rect, dest: Rect, flags: int = 0) -> None:
-        self.__backbuffer.blit(self.__images[spr.value], dest, src, flags)
+        ''' Queue a blit, rects must not change until the frame is flushed '''
+        queue = self.__queues.get(spr)
+        if queue is None:
+            queue = self.__queues[spr] = []
+        queue.append((self.__images[spr], dest, src, flags))
+
+    def draw_batch(self, spr: SpriteRegistry, srcs: list, dests: list) -> None:
+        ''' Queue many regions of the same image, srcs and dests are matched by index '''
+        queue = self.__queues.get(spr)
+        if queue is None:
+            queue = self.__queues[spr] = []
+        queue.extend(zip(repeat(self.__images[spr]), dests, srcs))
+
+    def flush(self) -> list:
+        '''
+        Blit the queued commands with one Surface.blits call per image, layer
+        by layer. Returns the backbuffer regions that changed, or None when
+        the whole backbuffer was drawn.
+        '''
+        layers = self.__layers
+        order = sorted(self.__queues, key=lambda spr: layers.get(spr, 0))
+        queues = self.__queues
+        self.__queues = {}
+        self.commands = sum(len(queues[spr]) for spr in order)
+        self.draw_calls = 0
+        dirty = None
+        if self.dirty_rects is True:
+            dirty = self.__dirty_regions(order, queues)
+            if dirty is None:
+                self.backbuffer.fill(self.CLS_COLOR)
+        if dirty is None:
+            for spr in order:
+                self.backbuffer.blits(queues[spr], doreturn=False)
+            self.draw_calls = len(order)
+            return None
+        for rect in dirty:
+            self.backbuffer.set_clip(rect)
+            self.backbuffer.fill(self.CLS_COLOR, rect)
+            for spr in order:
+                self.backbuffer.blits(queues[spr], doreturn=False)
+            self.draw_calls += len(order)
+        self.backbuffer.set_clip(None)
+        return dirty
+
+    def __dirty_regions(self, order: list, queues: dict) -> list:
+        '''
+        Compare the commands, in drawing order, with the ones of the previous
+        frame. The bounds of every command that appeared, disappeared or was
+        drawn in another order are merged into regions aligned to whole
+        screen pixels. None means redraw everything. The background layer is
+        compared first, when it moved the whole frame is dirty and the other
+        commands are not diffed.
+        '''
+        layers = self.__layers
+        bottom = LAYERS[SpriteRegistry.BACKGROUND]
+        backdrop: list = []
+        for spr in order:
+            if layers.get(spr, 0) <= bottom:
+                backdrop.extend(self.__keys(spr, queues[spr]))
+        if backdrop != self.__backdrop:
+            ''' The next frame with the same background is compared in full '''
+            self.__backdrop = backdrop
+            self.__full_redraw = True
+            self.dirty_count, self.dirty_area = 1, 1.0
+            return None
+        current: list = list(backdrop)
+        for spr in order:
+            if layers.get(spr, 0) > bottom:
+                current.extend(self.__keys(spr, queues[spr]))
+        previous = self.__previous
+        self.__previous = current
+        if self.__full_redraw is True:
+            self.__full_redraw = False
+            self.dirty_count, self.dirty_area = 1, 1.0
+            return None
+        changed = [] if current == previous else self.__changed(previous, current)
+        bounds = Rect((0, 0), self.bb_size)
+        regions: list = []
+        for _, _, x, y, src, _ in changed:
+            rect = self.__align(Rect(x, y, src[2], src[3])).clip(bounds)
+            if rect.w > 0 and rect.h > 0:
+                regions.append(rect)
+        regions = self.__merge(regions)
+        area = sum(rect.w * rect.h for rect in regions) / (bounds.w * bounds.h)
+        self.dirty_count, self.dirty_area = len(regions), area
+        if area > self.FULL_REDRAW:
+            return None
+        return regions
+
+    def __changed(self, previous: list, current: list) -> list:
+        '''
+        Commands that only one of the frames draws, counting duplicates, and
+        the ones drawn in another order relative to the commands both frames
+        draw. Of two commands that swapped, at least one changes position in
+        that common sequence, and its bounds cover their whole overlap.
+        '''
+        before, after = Counter(previous), Counter(current)
+        common = before & after
+        changed = list((before - common).elements()) + list((after - common).elements())
+        kept: list = []
+        for keys in (previous, current):
+            remaining = Counter(common)
+            sequence: list = []
+            for key in keys:
+                if remaining[key] > 0:
+                    remaining[key] -= 1
+                    sequence.append(key)
+            kept.append(sequence)
+        for old, new in zip(*kept):
+            if old != new:
+                changed.append(old)
+                changed.append(new)
+        return changed
+
+    def __keys(self, spr, commands: list):
+        ''' What identifies each command between frames '''
+        version = self.__versions.get(spr, 0)
+        for command in commands:
+            dest, src = command[1], command[2]
+            yield (spr, version, dest[0], dest[1], tuple(src), command[3] if len(command) > 3 else 0)
+
+    def __merge(self, regions: list) -> list:
+        ''' Union overlapping regions until none of them overlap '''
+        merged: list = []
+        for rect in regions:
+            rect = Rect(rect)
+            index = rect.collidelist(merged)
+            while index != -1:
+                rect.union_ip(merged.pop(index))
+                index = rect.collidelist(merged)
+            merged.append(rect)
+        return merged
+
+    def __align(self, rect: Rect) -> Rect:
+        ''' Grow the rect so it scales to whole screen pixels '''
+        sx, sy = self.__step
+        left = rect.left // sx * sx
+        top = rect.top // sy * sy
+        right = -(-rect.right // sx) * sx
+        bottom = -(-rect.bottom // sy) * sy
+        return Rect(left, top, right - left, bottom - top)
+
+    def __to_screen(self, rect: Rect) -> Rect:
+        bw, bh = self.bb_size
+        sw, sh = self.size
+        return Rect(rect.left * sw // bw, rect.top * sh // bh, rect.w * sw // bw, rect.h * sh // bh)
+
+    def stats(self) -> dict:
+        ''' Counters of the last flushed frame '''
+        stats = {'commands': self.commands, 'draw_calls': self.draw_calls}
+        if self.dirty_rects is True:
+            stats['dirty_rects'] = self.dirty_count
+            stats['dirty_area'] = self.dirty_area
+        return stats
+
+
+class TextureRenderer(SdlRenderer):
+    '''
+    Uploads the backbuffer to an SDL2 streaming texture each frame and lets
+    the SDL render driver scale it to the window, so presenting no longer
+    costs a software scale. Dirty rectangle mode is not supported.
+    '''
+    INTEGER = 'integer'  # Largest whole multiple of the backbuffer, centered
+    NEAREST = 'nearest'  # Fill the window keeping the aspect ratio, blocky pixels
+    SMOOTH = 'smooth'  # Fill the window keeping the aspect ratio, filtered
+
+    def __init__(self, bb_width: int, bb_height: int, sc_width: int, sc_height: int, fullscreen: bool = False,
+                 scaling: str = INTEGER, vsync: bool = True, accelerated: bool = True):
+        self.scaling: str = scaling
+        self.vsync: bool = vsync
+        self.accelerated: bool = accelerated
+        super().__init__(bb_width, bb_height, sc_width, sc_height, fullscreen)
+        self.texture: Texture = Texture(self.video, self.bb_size, streaming=True)
+        ''' The backbuffer has no alpha, its padding byte must not be blended '''
+        self.texture.blend_mode = 0
+
+    def create_screen(self, fullscreen: bool) -> None:
+        '''
+        Raises RuntimeError when no matching render driver is available. The
+        scale quality hint is read by SDL when the texture is created.
+        '''
+        os.environ['SDL_RENDER_SCALE_QUALITY'] = 'linear' if self.scaling == self.SMOOTH else 'nearest'
+        self.window: Window = Window("Project-X", size=self.size, fullscreen=fullscreen)
+        try:
+            self.video: VideoRenderer = VideoRenderer(
+                self.window, accelerated=1 if self.accelerated else 0, vsync=self.vsync)
+        except RuntimeError:
+            self.window.destroy()
+            raise
+        self.screen = None
+        self.target: Rect = self.__target(self.window.size)
+
+    def convert(self, surface: Surface) -> Surface:
+        ''' There is no display surface to convert to, use the same 32 bit ARGB layout '''
+        return surface.convert(32, SRCALPHA)
+
+    def present(self, dirty: list) -> None:
+        self.texture.update(self.backbuffer)
+        self.video.clear()
+        self.texture.draw(dstrect=self.target)
+        self.video.present()
+
+    def __target(self, size: tuple) -> Rect:
+        bw, bh = self.bb_size
+        sw, sh = size
+        if self.scaling == self.INTEGER:
+            factor = max(1, min(sw // bw, sh // bh))
+            width, height = bw * factor, bh * factor
+        else:
+            factor = min(sw / bw, sh / bh)
+            width, height = int(bw * factor), int(bh * factor)
+        return Rect((sw - width) // 2, (sh - height) // 2, width, height)
+
+
+class OffscreenRenderer(SdlRenderer):
+    '''
+    Draws into the backbuffer and never presents it, for reading frames back
+    as pixels. A 1x1 display mode is still set, converting images needs one.
+    '''
+
+    def create_screen(self, fullscreen: bool) -> None:
+        self.screen = set_mode((1, 1))
+
+    def present(self, dirty: list) -> None:
+        pass
+
+
+def create_renderer(bb_width: int, bb_height: int, sc_width: int, sc_height: int, fullscreen: bool = False,
+                    scaling: str = TextureRenderer.INTEGER, vsync: bool = True) -> SdlRenderer:
+    ''' TextureRenderer on machines with an accelerated render driver, SdlRenderer otherwise '''
+    try:
+        return TextureRenderer(bb_width, bb_height, sc_width, sc_height, fullscreen, scaling, vsync)
+    except RuntimeError:
+        return SdlRenderer(bb_width, bb_height, sc_width, sc_height, fullscreen)
+
+
+class NullRenderer(Renderer):
+    ''' Renderer that draws nothing, for running the simulation without a display '''
+
+    def __init__(self, bb_width: int, bb_height: int, sc_width: int = 0, sc_height: int = 0, fullscreen: bool = False):
+        self.bb_size = (bb_width, bb_height)
+        self.commands: int = 0
+
+    def cls(self) -> None:
+        self.commands = 0
+
+    def draw(self, spr: SpriteRegistry, src: Rect, dest: Rect, flags: int = 0) -> None:
+        self.commands += 1
+
+    def draw_batch(self, spr: SpriteRegistry, srcs: list, dests: list) -> None:
+        self.commands += len(dests)
+
+    def stats(self) -> dict:
+        return {'commands': self.commands, 'draw_calls': 0}
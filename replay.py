@@ -0,0 +1,99 @@
+import struct
+from controls import InputSnapshot, VirtualInput
+
+
+class InputCodec(object):
+    '''
+    The input of one tick is stored as the 12 device state bits of its
+    InputSnapshot: direction x and y, shifted to 0..2, in the two low bit
+    pairs and one bit per button above them. Edges are derived again on
+    playback.
+    '''
+
+    @classmethod
+    def encode(cls, input: InputSnapshot) -> int:
+        return input & InputSnapshot.STATE_MASK
+
+    @classmethod
+    def decode(cls, value: int, input: VirtualInput) -> None:
+        input.direction.update((value & 3) - 1, ((value >> 2) & 3) - 1)
+        input.buttons.bits = (value >> InputSnapshot.HELD) & 0xFF
+        input.buttons.taps = 0
+
+
+class ReplayFile(object):
+    '''
+    Header: magic, format version and the RNG seed of the run. Then one
+    record per tick: the frame time in ms and the encoded input.
+    '''
+    MAGIC = b'PXRP'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHI')
+    TICK = struct.Struct('<HH')
+
+
+class Recorder(object):
+    ''' Appends the input and frame time of every engine tick to a replay file '''
+
+    def __init__(self, path: str, seed: int):
+        self.path: str = path
+        self.ticks: int = 0
+        self.__file = open(path, 'wb')
+        self.__file.write(ReplayFile.HEADER.pack(ReplayFile.MAGIC, ReplayFile.VERSION, seed))
+
+    def record(self, time: int, input: InputSnapshot) -> None:
+        self.__file.write(ReplayFile.TICK.pack(min(time, 0xFFFF), InputCodec.encode(input)))
+        self.ticks += 1
+
+    def close(self) -> None:
+        self.__file.close()
+
+
+class ReplayInput(VirtualInput):
+    ''' Feeds back recorded input, one tick per `on_event` call '''
+
+    def __init__(self, inputs: list):
+        super().__init__()
+        self.inputs: list = inputs
+        self.tick: int = 0
+
+    def on_event(self) -> None:
+        if self.tick < len(self.inputs):
+            InputCodec.decode(self.inputs[self.tick], self)
+            self.tick += 1
+
+
+class ReplayClock(object):
+    ''' FixedClock stand-in that returns the recorded frame times in order '''
+
+    def __init__(self, times: list):
+        self.times: list = times
+        self.ticks: int = 0
+
+    def tick(self, framerate: int = 0) -> int:
+        self.ticks += 1
+        return self.get_time()
+
+    def get_time(self) -> int:
+        return self.times[min(self.ticks, len(self.times) - 1)]
+
+
+class Replay(object):
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, self.seed = ReplayFile.HEADER.unpack_from(data)
+        if magic != ReplayFile.MAGIC or version != ReplayFile.VERSION:
+            raise ValueError("{} is not a version {} replay".format(path, ReplayFile.VERSION))
+        ticks = list(ReplayFile.TICK.iter_unpack(data[ReplayFile.HEADER.size:]))
+        self.times: list = [time for time, _ in ticks]
+        self.inputs: list = [value for _, value in ticks]
+
+    def __len__(self) -> int:
+        return len(self.inputs)
+
+    def input(self) -> ReplayInput:
+        return ReplayInput(self.inputs)
+
+    def clock(self) -> ReplayClock:
+        return ReplayClock(self.times)
@@ -0,0 +1,35 @@
+import os
+from random import Random
+
+
+class RngStreams(object):
+    '''
+    Independent random streams, one per subsystem, all derived from a single
+    seed. A subsystem that rolls more or less often does not shift the rolls
+    of the others, so a recorded run replays the same with the same seed.
+    Streams are reseeded in place, references to them stay valid.
+    '''
+
+    def __init__(self, seed: int = None):
+        self.streams: dict = {}
+        self.seed(seed)
+
+    def seed(self, seed: int = None) -> int:
+        ''' Reseed every stream, a random seed is picked when none is given. Returns the seed '''
+        self.base: int = int.from_bytes(os.urandom(4), 'little') if seed is None else seed
+        for name, stream in self.streams.items():
+            stream.seed(self.__derive(name))
+        return self.base
+
+    def get(self, name: str) -> Random:
+        stream = self.streams.get(name)
+        if stream is None:
+            stream = self.streams[name] = Random(self.__derive(name))
+        return stream
+
+    def __derive(self, name: str) -> str:
+        ''' String seeds are hashed by Random itself, independent of PYTHONHASHSEED '''
+        return "{}:{}".format(self.base, name)
+
+
+RNG: RngStreams = RngStreams()
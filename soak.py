@@ -0,0 +1,230 @@
+import gc
+import json
+import os
+import signal
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from time import perf_counter
+from renderer import SdlRenderer, use_headless_drivers
+from engine import Engine
+from game import LoadState
+from bot import BotInput
+from benchmark import percentile
+from rng import RNG
+from sprites import Bullet, DiagUpBullet, DiagDownBullet, Explosion, Asteroid, PowerUp
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+WATCHED = (Bullet, DiagUpBullet, DiagDownBullet, Explosion, Asteroid, PowerUp)
+
+
+def rss() -> int:
+    ''' Resident set size in bytes, the peak where the current one can not be read '''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        pass
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def object_counts() -> dict:
+    ''' Live instances per watched class, pooled ones included '''
+    counts: dict = {cls.__name__: 0 for cls in WATCHED}
+    names: dict = {cls: cls.__name__ for cls in WATCHED}
+    for obj in gc.get_objects():
+        name = names.get(type(obj))
+        if name is not None:
+            counts[name] += 1
+    return counts
+
+
+def growing(values: list, window: int, slack: float) -> bool:
+    '''
+    True when each of the last `window` values is above the one before and
+    the last one is more than `slack` (a fraction of the first) above the
+    first. Pools and caches that grow to a high water mark and stay there
+    are not flagged.
+    '''
+    tail = values[-window:]
+    if len(tail) < window:
+        return False
+    return all(b > a for a, b in zip(tail, tail[1:])) and tail[-1] > tail[0] * (1 + slack)
+
+
+class Soak(object):
+    '''
+    Lets the bot play headless for a long time and samples memory, object
+    counts and tick times every `interval` ticks. Series that keep growing
+    over the last `window` samples are reported as suspected leaks. Each
+    sample is printed as it is taken and, with `save`, written out right
+    away, so a run that gets killed keeps what it measured.
+    '''
+    ALLOCATORS = 5  # Top allocation sites kept per sample
+    MEMORY_SLACK = 0.02  # Memory has to grow by more than this to count
+
+    def __init__(self, interval: int = 3000, window: int = 6, trace_memory: bool = True, immortal: bool = False,
+                 save: str = None):
+        use_headless_drivers()
+        self.interval: int = interval
+        self.save_path: str = save
+        self.immortal: bool = immortal
+        self.window: int = window
+        self.trace_memory: bool = trace_memory
+        self.renderer: SdlRenderer = SdlRenderer(320, 240, 800, 600)
+        self.engine: Engine = Engine(self.renderer, headless=True)
+        self.bot: BotInput = BotInput()
+        self.samples: list = []
+        self.ticks: int = 0
+        self.__first = None  # tracemalloc snapshot of the first sample
+        self.__last = None
+
+    def run(self, ticks: int = 0, seconds: float = 0) -> list:
+        ''' Play until `ticks` ticks or `seconds` of wall time have passed, whichever comes first '''
+        if self.trace_memory is True:
+            tracemalloc.start()
+        state = LoadState(self.renderer)
+        times: list = []
+        start = perf_counter()
+        try:
+            while (ticks <= 0 or self.ticks < ticks) and (seconds <= 0 or perf_counter() - start < seconds):
+                if self.immortal is True:
+                    self.keep_alive(state)
+                self.bot.state = state
+                begin = perf_counter()
+                state = self.engine.step(state, 1, self.bot)
+                times.append((perf_counter() - begin) * 1000)
+                self.ticks += 1
+                if self.ticks % self.interval == 0:
+                    self.sample(state, times, perf_counter() - start)
+                    times = []
+        finally:
+            if self.trace_memory is True:
+                tracemalloc.stop()
+        return self.samples
+
+    def keep_alive(self, state) -> None:
+        ''' One PlayState for the whole run, so whatever it accumulates keeps piling up '''
+        craft = getattr(state, 'craft', None)
+        if craft is not None and 'destroy' not in vars(craft):
+            craft.destroy = lambda: None
+
+    def sample(self, state, times: list, elapsed: float) -> dict:
+        sample = {
+            'tick': self.ticks,
+            'elapsed_s': elapsed,
+            'rss_kb': rss() / 1024,
+            'objects': object_counts(),
+            'powerups': len(getattr(state, 'powerups', [])),
+            'score': getattr(state, 'score', 0),
+            'tick_ms': {
+                'p50': percentile(times, 50),
+                'p95': percentile(times, 95),
+                'p99': percentile(times, 99),
+                'max': max(times) if times else 0.0,
+            },
+        }
+        if self.trace_memory is True:
+            sample['traced_kb'] = tracemalloc.get_traced_memory()[0] / 1024
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                tracemalloc.Filter(False, __file__),
+            ))
+            if self.__first is None:
+                self.__first = snapshot
+            sample['allocators'] = [str(stat) for stat in snapshot.statistics('lineno')[:self.ALLOCATORS]]
+            self.__last = snapshot
+        self.samples.append(sample)
+        report(sample)
+        if self.save_path is not None:
+            self.save()
+        return sample
+
+    def save(self) -> None:
+        ''' Write everything sampled so far, the file is replaced in one step so it is never half written '''
+        partial = self.save_path + '.tmp'
+        with open(partial, 'w') as f:
+            json.dump({'seed': RNG.base, 'ticks': self.ticks, 'samples': self.samples,
+                       'leaks': self.leaks(), 'growth': self.growth()}, f, indent=2)
+        os.replace(partial, self.save_path)
+
+    def series(self) -> dict:
+        ''' Every sampled quantity over time with the growth it needs to be flagged '''
+        series: dict = {'rss_kb': ([s['rss_kb'] for s in self.samples], self.MEMORY_SLACK)}
+        if self.trace_memory is True:
+            series['traced_kb'] = ([s['traced_kb'] for s in self.samples], self.MEMORY_SLACK)
+        for cls in WATCHED:
+            series[cls.__name__] = ([s['objects'][cls.__name__] for s in self.samples], 0)
+        return series
+
+    def leaks(self) -> list:
+        return [name for name, (values, slack) in self.series().items() if growing(values, self.window, slack)]
+
+    def growth(self, limit: int = 10) -> list:
+        ''' Allocation sites that grew the most between the first and last sample '''
+        if self.__first is None or self.__last is self.__first:
+            return []
+        stats = self.__last.compare_to(self.__first, 'lineno')
+        return [str(stat) for stat in stats[:limit] if stat.size_diff > 0]
+
+
+def report(sample: dict) -> None:
+    counts = " ".join("{}={}".format(name, count) for name, count in sample['objects'].items())
+    print("tick {tick:>8} {elapsed_s:>8.0f}s rss {rss_kb:>8.0f} KiB".format(**sample)
+          + (" traced {:>7.0f} KiB".format(sample['traced_kb']) if 'traced_kb' in sample else "")
+          + " tick ms p50 {p50:.2f} p95 {p95:.2f} p99 {p99:.2f} max {max:.2f}".format(**sample['tick_ms'])
+          + " | " + counts + " powerups={}".format(sample['powerups']), flush=True)
+
+
+def interrupt(signum, frame) -> None:
+    ''' Stop on SIGTERM like on Ctrl+C, so the summary is still printed '''
+    raise KeyboardInterrupt
+
+
+def main() -> int:
+    parser = ArgumentParser(description="Let the bot play headless for a long time and look for leaks")
+    parser.add_argument("--hours", type=float, default=1.0, help="wall time to run for (default 1)")
+    parser.add_argument("--ticks", type=int, default=0, help="stop after this many ticks instead")
+    parser.add_argument("--interval", type=int, default=3000, help="ticks between samples (default 3000)")
+    parser.add_argument("--window", type=int, default=6,
+                        help="samples a series has to keep growing for to be flagged (default 6)")
+    parser.add_argument("--seed", type=int, help="seed of the game and the bot")
+    parser.add_argument("--immortal", action="store_true",
+                        help="the craft never dies, one PlayState lasts the whole run")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip allocation tracing, runs faster")
+    parser.add_argument("--save", metavar="PATH", help="write the samples as JSON")
+    args = parser.parse_args()
+
+    print("seed {}".format(RNG.seed(args.seed)))
+    soak = Soak(args.interval, args.window, trace_memory=not args.no_tracemalloc, immortal=args.immortal,
+                save=args.save)
+    seconds = 0 if args.ticks > 0 else args.hours * 3600
+    signal.signal(signal.SIGTERM, interrupt)
+    try:
+        soak.run(args.ticks, seconds)
+    except KeyboardInterrupt:
+        print("interrupted after {} ticks".format(soak.ticks))
+    growth = soak.growth()
+    if len(growth) > 0:
+        print("top allocation growth since the first sample")
+        for stat in growth:
+            print("  " + stat)
+    leaks = soak.leaks()
+    for name in leaks:
+        print("LEAK {} grew over the last {} samples".format(name, args.window))
+    if args.save:
+        soak.save()
+    return 1 if leaks else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
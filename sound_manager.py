@@ -1,22 +1,213 @@
 import pygame.mixer as mixer
+from asset_pack import PACK
+from startup import TIMELINE
+
+
+class MusicPlayer(object):
+    '''
+    Streams music tracks from disk through `mixer.music`, only a small
+    decode buffer is kept in memory. There is a single music stream, so a
+    crossfade fades the current track out and then fades the next one in.
+    '''
+    MAIN = 'main'
+    FADE_MS = 1000
+
+    def __init__(self, tracks: dict):
+        self.tracks: dict = tracks
+        self.current: str = None
+        self.paused: bool = False
+        self.playlist: list = []
+        self.loop: bool = False
+        self.__position: int = 0
+        self.__pending: str = None
+        self.__pending_loops: int = 0
+        self.__fade: int = 0
+
+    def play(self, track: str, loops: int = -1, fade_ms: int = 0) -> None:
+        ''' Start a track right away, `loops` as in `mixer.music.play` '''
+        mixer.music.load(self.tracks[track])
+        mixer.music.play(loops, fade_ms=fade_ms)
+        self.current = track
+        self.paused = False
+        self.__pending = None
+
+    def crossfade(self, track: str, loops: int = -1, fade_ms: int = FADE_MS) -> None:
+        if self.current is None or self.paused is True:
+            self.play(track, loops, fade_ms // 2)
+            return
+        mixer.music.fadeout(fade_ms // 2)
+        self.__pending = track
+        self.__pending_loops = loops
+        self.__fade = fade_ms // 2
+
+    def play_list(self, tracks: list, loop: bool = True, fade_ms: int = FADE_MS) -> None:
+        ''' Play the tracks once each, in order, moving on when one ends '''
+        self.playlist = list(tracks)
+        self.loop = loop
+        self.__position = 0
+        self.crossfade(self.playlist[0], 0, fade_ms)
+
+    def pause(self) -> None:
+        if self.current is not None and self.paused is False:
+            mixer.music.pause()
+            self.paused = True
+
+    def resume(self) -> None:
+        if self.paused is True:
+            mixer.music.unpause()
+            self.paused = False
+
+    def stop(self) -> None:
+        mixer.music.stop()
+        self.current = None
+        self.paused = False
+        self.playlist = []
+        self.__pending = None
+
+    def follow(self, track: str) -> None:
+        '''
+        Match the music a game state asks for: None pauses, the current
+        track resumes and any other track is crossfaded in.
+        '''
+        if track is None:
+            self.pause()
+        elif track == self.current and self.__pending is None:
+            self.resume()
+        elif track != self.__pending:
+            self.playlist = []
+            self.crossfade(track)
+
+    def update(self, time: int) -> None:
+        if self.paused is True or self.current is None or mixer.music.get_busy():
+            return
+        if self.__pending is not None:
+            self.play(self.__pending, self.__pending_loops, self.__fade)
+        elif len(self.playlist) > 0:
+            self.__position += 1
+            if self.__position == len(self.playlist):
+                if self.loop is False:
+                    self.stop()
+                    return
+                self.__position = 0
+            self.play(self.playlist[self.__position], 0)
+
+
+class Voice(object):
+    ''' What one mixer channel of the pool is playing '''
+    __slots__ = ('channel', 'type', 'priority', 'started', 'volume')
+
+    def __init__(self, channel: mixer.Channel):
+        self.channel: mixer.Channel = channel
+        self.type: int = 0
+        self.priority: int = 0
+        self.started: int = 0
+        self.volume: float = 1.0
 
 
 class SoundManager(object):
+    '''
+    Plays effects on a fixed pool of voices. Each sound has a priority and
+    a limit of concurrent voices. Triggers of a sound within COALESCE_MS of
+    its last start are merged into that voice, which gets a bit louder.
+    When the pool is full the oldest voice of the lowest priority, not
+    above the new sound, is stolen, otherwise the trigger is dropped.
+    '''
     FIRE = 1
     EXPLODE = 2
     PLAYER_EXPLODE = 3
 
-    def __init__(self):
-        self.sounds = {
-            self.FIRE: mixer.Sound('assets/sounds/Retro_8-Bit_Game-Gun_Laser_Weapon_Shoot_Beam_07.wav'),
-            self.EXPLODE: mixer.Sound('assets/sounds/Retro_8-Bit_Game-Bomb_Explosion_08.wav'),
-            self.PLAYER_EXPLODE: mixer.Sound('assets/sounds/Retro_8-Bit_Game-Bomb_Explosion_02.wav'),
-        }
-        self.sounds.get(self.FIRE).set_volume(0.5)
-        self.music = mixer.Sound('assets/sounds/space-asteroids.ogg')
+    CHANNELS = 8
+    COALESCE_MS = 60
+    VOICE_VOLUME = 0.7  # Channel volume of a single trigger
+    MERGE_GAIN = 0.1  # Extra channel volume per merged trigger, up to full volume
+
+    ''' Sample, volume, priority and concurrent voices of each sound '''
+    SOUNDS = {
+        FIRE: ('assets/sounds/Retro_8-Bit_Game-Gun_Laser_Weapon_Shoot_Beam_07.wav', 0.5, 0, 2),
+        EXPLODE: ('assets/sounds/Retro_8-Bit_Game-Bomb_Explosion_08.wav', 1.0, 1, 4),
+        PLAYER_EXPLODE: ('assets/sounds/Retro_8-Bit_Game-Bomb_Explosion_02.wav', 1.0, 2, 1),
+    }
 
-    def play(self, type: int) -> None:
-        mixer.Channel(type).play(self.sounds.get(type))
+    def __init__(self, channels: int = CHANNELS):
+        self.channels: int = channels
+        self.started: bool = False
+        self.sounds: dict = {}
+        self.voices: list = []
+        self.time: int = 0
+        self.played: int = 0
+        self.merged: int = 0
+        self.stolen: int = 0
+        self.dropped: int = 0
+        self.music = MusicPlayer({
+            MusicPlayer.MAIN: 'assets/sounds/space-asteroids.ogg',
+        })
+
+    def start(self) -> None:
+        ''' Open the audio device and load the effects, sounds played before are ignored '''
+        if self.started is True:
+            return
+        with TIMELINE.phase('mixer.init'):
+            mixer.init()
+            mixer.set_num_channels(self.channels)
+        for type, (path, volume, _, _) in self.SOUNDS.items():
+            with TIMELINE.phase('sound ' + path):
+                sound = PACK.sound(path)
+                self.sounds[type] = mixer.Sound(path) if sound is None else sound
+            self.sounds[type].set_volume(volume)
+        self.voices = [Voice(mixer.Channel(i)) for i in range(self.channels)]
+        self.started = True
+
+    def play(self, type: int, count: int = 1) -> None:
+        ''' Trigger a sound `count` times in the same instant '''
+        if self.started is False:
+            return
+        _, _, priority, limit = self.SOUNDS[type]
+        free: Voice = None
+        same: list = []
+        victim: Voice = None
+        for voice in self.voices:
+            if voice.channel.get_busy() is False:
+                if free is None:
+                    free = voice
+                continue
+            if voice.type == type:
+                same.append(voice)
+            if voice.priority <= priority and (victim is None or (voice.priority, voice.started)
+                                               < (victim.priority, victim.started)):
+                victim = voice
+        if len(same) > 0:
+            latest = max(same, key=lambda voice: voice.started)
+            if self.time - latest.started < self.COALESCE_MS:
+                latest.volume = min(1.0, latest.volume + self.MERGE_GAIN * count)
+                latest.channel.set_volume(latest.volume)
+                self.merged += count
+                return
+        self.merged += count - 1
+        if len(same) >= limit:
+            voice = min(same, key=lambda voice: voice.started)
+            self.stolen += 1
+        elif free is not None:
+            voice = free
+        elif victim is not None:
+            voice = victim
+            self.stolen += 1
+        else:
+            self.dropped += 1
+            return
+        voice.type = type
+        voice.priority = priority
+        voice.started = self.time
+        voice.volume = min(1.0, self.VOICE_VOLUME + self.MERGE_GAIN * (count - 1))
+        voice.channel.set_volume(voice.volume)
+        voice.channel.play(self.sounds[type])
+        self.played += 1
 
     def start_music(self, loop: int = -1) -> None:
-        self.music.play(loop)
+        self.music.play(MusicPlayer.MAIN, loop)
+
+    def update(self, time: int) -> None:
+        self.time += time
+        self.music.update(time)
+
+    def stats(self) -> dict:
+        return {'played': self.played, 'merged': self.merged, 'stolen': self.stolen, 'dropped': self.dropped}
@@ -1,21 +1,68 @@
 from pygame.sprite import Sprite
-from pygame import Rect
-from renderer import Renderer, SpriteRegistry
-from action import Frame, Action
-from controls import Input, State
+from pygame import Rect, BLEND_PREMULTIPLIED
+from renderer import Renderer, SpriteRegistry, LAYERS
+from action import Clip, ClipFrame, ClipRegistry, Playhead
+from controls import InputSnapshot, State, IDLE_INPUT
 from pygame.math import Vector2
-from random import randint
-from engine import Engine
-from pygame.event import post, Event
+from rng import RNG
 from typing import Optional
 from timer import Timer
-
-class GameEvent:
-    CRAFT_SHOOTED = 0
-    ENEMY_DESTROYED = 1
-    PLAYER_DESTROYED = 2  
+from collision import SpatialHash, MASKS
+from emitters import BulletField, Emitter
+from pool import Pool
+from events import GameEvent, BUS
+
+class CollisionGroup:
+    CRAFT = 0
+    BULLETS = 1
+
+
+ASTEROID_RNG = RNG.get('asteroids')
+POWERUP_RNG = RNG.get('powerups')
+
+FRAME_MS = 66  # Two ticks at 30 FPS, the pace all sheets were drawn for
+CLIPS: ClipRegistry = ClipRegistry()
+
+
+def register_clips(registry: ClipRegistry) -> None:
+    ''' Build the animation clips of every sprite sheet, they are shared by all entities '''
+    explosion = [ClipFrame((32 * i, 0, 32, 32)) for i in range(10)] \
+        + [ClipFrame((32 * i, 32, 32, 32)) for i in range(7)]
+    registry.register(SpriteRegistry.EXPLOSION, 'large', Clip.uniform(
+        [explosion[i] for i in [1, 2, 3, 4, 5, 6, 7, 8, 9, 0, 11, 12, 13, 14, 15, 16]], FRAME_MS))
+    registry.register(SpriteRegistry.EXPLOSION, 'small', Clip.uniform(
+        [explosion[i] for i in [1, 2, 3, 4, 11, 12, 13, 14, 15, 16]], FRAME_MS))
+
+    ''' The straight bullet grows upwards, the offset keeps its top edge moving up '''
+    registry.register(SpriteRegistry.BULLET, 'bullet', Clip.uniform([
+        ClipFrame((0, 5, 11, 6), (0, 0)),
+        ClipFrame((16, 4, 11, 8), (0, -1)),
+        ClipFrame((32, 3, 11, 10), (0, -2)),
+        ClipFrame((48, 2, 11, 12), (0, -3)),
+        ClipFrame((64, 1, 11, 14), (0, -4)),
+        ClipFrame((80, 0, 11, 16), (0, -5)),
+    ], FRAME_MS))
+    registry.register(SpriteRegistry.BULLET, 'diag_up', Clip.uniform([
+        ClipFrame((275, 35, 10, 10)),
+        ClipFrame((289, 33, 15, 14)),
+    ], FRAME_MS))
+    registry.register(SpriteRegistry.BULLET, 'diag_down', Clip.uniform([
+        ClipFrame((275, 51, 10, 10)),
+        ClipFrame((289, 49, 15, 14)),
+    ], FRAME_MS))
+
+    craft = [ClipFrame(((i % 5) * Craft.WIDTH, (i // 5) * Craft.HEIGHT, Craft.WIDTH, Craft.HEIGHT))
+             for i in range(14)]
+    registry.register(SpriteRegistry.CRAFT, 'flying', Clip.uniform([craft[0]], FRAME_MS))
+    registry.register(SpriteRegistry.CRAFT, 'up', Clip.uniform([craft[1], craft[2]], FRAME_MS))
+    registry.register(SpriteRegistry.CRAFT, 'down', Clip.uniform([craft[3], craft[4]], FRAME_MS))
+    registry.register(SpriteRegistry.CRAFT, 'restore_up', Clip.uniform([craft[2], craft[1], craft[0]], FRAME_MS))
+    registry.register(SpriteRegistry.CRAFT, 'restore_down', Clip.uniform([craft[4], craft[3], craft[0]], FRAME_MS))
 
 class GameObject(Sprite):
+    ''' Pixel mask of the current frame, None collides with the whole rect '''
+    mask = None
+
     def spawn(self) -> None:
         pass
 
@@ -35,97 +82,73 @@ class Background(Sprite):
 
     def __init__(self):
         super().__init__()
-        self.input: Input = None
-        ''' Setup layers for scrolling '''
+        ''' Setup layers for scrolling, drawn in this order '''
         self.layers = [
-            {
-                "y": 2048,
-                "scroll_x": 0,
-                "scroll_step": 0,
-                "view_rect_left": None,
-                "view_rect_right": None,
-                "source_rect_left": None,
-                "source_rect_right": None,
-            },
-            {
-                "y": 768,
-                "scroll_x": 0,
-                "scroll_step": 0.5,
-                "view_rect_left": None,
-                "view_rect_right": None,
-                "source_rect_left": None,
-                "source_rect_right": None,
-            },
-            {
-                "y": 1792,
-                "scroll_x": 0,
-                "scroll_step": 0.5,
-                "view_rect_left": None,
-                "view_rect_right": None,
-                "source_rect_left": None,
-                "source_rect_right": None,
-            },
-            {
-                "y": 1536,
-                "scroll_x": 0,
-                "scroll_step": 0.5,
-                "view_rect_left": None,
-                "view_rect_right": None,
-                "source_rect_left": None,
-                "source_rect_right": None,
-            },
-            {
-                "y": 1024,
-                "scroll_x": 0,
-                "scroll_step": 1,
-                "view_rect_left": None,
-                "view_rect_right": None,
-                "source_rect_left": None,
-                "source_rect_right": None,
-            },
-            {
-                "y": 1280,
-                "scroll_x": 0,
-                "scroll_step": 1,
-                "view_rect_left": None,
-                "view_rect_right": None,
-                "source_rect_left": None,
-                "source_rect_right": None,
-            },
-            {
-                "y": 512,
-                "scroll_x": 0,
-                "scroll_step": 1,
-                "view_rect_left": None,
-                "view_rect_right": None,
-                "source_rect_left": None,
-                "source_rect_right": None,
-            },
-            {
-                "y": 256,
-                "scroll_x": 0,
-                "scroll_step": 1,
-                "view_rect_left": None,
-                "view_rect_right": None,
-                "source_rect_left": None,
-                "source_rect_right": None,
-            }
+            {"y": 2048, "scroll_step": 0},
+            {"y": 768, "scroll_step": 0.5},
+            {"y": 1792, "scroll_step": 0.5, "translucent": True},
+            {"y": 1536, "scroll_step": 0.5, "translucent": True},
+            {"y": 1024, "scroll_step": 1},
+            {"y": 1280, "scroll_step": 1},
+            {"y": 512, "scroll_step": 1},
+            {"y": 256, "scroll_step": 1},
         ]
+        '''
+        Consecutive layers with the same scroll step always line up, so each
+        run of them is pre-composed once into a strip. A strip holds the
+        layer width plus one view width, which lets a single source rect
+        sliding over it replace the left and right blits of every layer.
+        Translucent layers get a strip of their own, blending them ahead of
+        time would not round like blending them onto the backbuffer.
+        '''
+        self.strips: list = []
+        for layer in self.layers:
+            translucent = layer.get("translucent", False)
+            if len(self.strips) == 0 or self.strips[-1]["scroll_step"] != layer["scroll_step"] \
+                    or self.strips[-1]["translucent"] is True or translucent is True:
+                self.strips.append({
+                    "name": ("background", len(self.strips)),
+                    "scroll_x": 0,
+                    "scroll_step": layer["scroll_step"],
+                    "translucent": translucent,
+                    "layers": [],
+                    "source_rect": Rect(0, 0, 0, 0),
+                })
+            self.strips[-1]["layers"].append(layer)
+        self.composed: bool = False
 
     def update(self, time: int):
-        for layer in self.layers:
-            layer['scroll_x'] += layer['scroll_step']
-            if layer['scroll_x'] > self.WIDTH:
-                layer['scroll_x'] = 0
-            layer['view_rect_left'] = Rect(0, 0, self.WIDTH - layer['scroll_x'], self.HEIGHT)
-            layer['view_rect_right'] = Rect(self.WIDTH - layer['scroll_x'], 0, layer['scroll_x'], self.HEIGHT)
-            layer['source_rect_left'] = Rect(layer['scroll_x'], layer['y'], layer['view_rect_left'].w, self.HEIGHT)
-            layer['source_rect_right'] = Rect(0, layer['y'], layer['view_rect_right'].w, self.HEIGHT)
+        for strip in self.strips:
+            if strip['scroll_step'] == 0:
+                continue
+            strip['scroll_x'] += strip['scroll_step']
+            if strip['scroll_x'] > self.WIDTH:
+                strip['scroll_x'] = 0
+
+    def compose(self, renderer: Renderer) -> None:
+        view_width = min(renderer.bb_size[0], self.WIDTH)
+        height = min(renderer.bb_size[1], self.HEIGHT)
+        for strip in self.strips:
+            static = strip['scroll_step'] == 0
+            parts: list = []
+            for layer in strip['layers']:
+                parts.append((SpriteRegistry.BACKGROUND, Rect(0, layer['y'], self.WIDTH, height), (0, 0)))
+                if static is False:
+                    parts.append((SpriteRegistry.BACKGROUND, Rect(0, layer['y'], view_width, height), (self.WIDTH, 0)))
+            width = view_width if static else self.WIDTH + view_width
+            renderer.compose_image(strip['name'], (width, height), parts)
+            strip['source_rect'].size = (view_width, height)
+        self.composed = True
 
     def draw(self, renderer: Renderer) -> None:
-        for layer in self.layers:
-            renderer.draw(SpriteRegistry.BACKGROUND, layer['source_rect_left'], layer['view_rect_left'])
-            renderer.draw(SpriteRegistry.BACKGROUND, layer['source_rect_right'], layer['view_rect_right'])
+        if self.composed is False:
+            self.compose(renderer)
+        alpha = renderer.alpha
+        for strip in self.strips:
+            ''' Fractional steps only move the strip every few ticks, the strip repeats every WIDTH '''
+            scroll_x = strip['scroll_x'] - strip['scroll_step'] * (1.0 - alpha) if alpha < 1.0 else strip['scroll_x']
+            strip['source_rect'].x = int(scroll_x % self.WIDTH if scroll_x < 0 else scroll_x)
+            renderer.draw(strip['name'], strip['source_rect'], (0, 0))
 
 
 class PowerUp(Sprite):
@@ -147,11 +170,13 @@ class PowerUp(Sprite):
         variants.append(Rect(48, 0, self.WIDTH, self.HEIGHT))  # Rockets (2)
         variants.append(Rect(72, 0, self.WIDTH, self.HEIGHT))  # Shield (3)
         variants.append(Rect(96, 0, self.WIDTH, self.HEIGHT))  # Extra speed (4)
-        self.skin = randint(0, 4)
+        self.skin = POWERUP_RNG.randint(0, 4)
         self.src = variants[self.skin]
         self.vY = -10
+        self.previous: tuple = None
 
     def update(self, time: int) -> None:
+        self.previous = self.rect.topleft
         self.rect.left -= 1
         if self.vY < 0:
             self.rect.top -= 1
@@ -165,7 +190,7 @@ class PowerUp(Sprite):
                 self.vY = -10
 
     def draw(self, renderer: Renderer) -> None:
-        renderer.draw(SpriteRegistry.POWERUP, self.src, self.rect)
+        renderer.draw(SpriteRegistry.POWERUP, self.src, renderer.lerp(self.previous, self.rect))
 
     def is_alive(self) -> bool:
         return self.alive
@@ -182,65 +207,19 @@ class PowerUp(Sprite):
 class Explosion(Sprite):
     def __init__(self, action: int = 0, rect: Rect = None):
         super().__init__()
+        self.__rect: Rect = Rect(0, 0, 32, 32)
+        self.playhead: Playhead = Playhead(CLIPS.get(SpriteRegistry.EXPLOSION, 'large'))
+        self.reset(action, rect)
+
+    def reset(self, action: int = 0, rect: Rect = None) -> None:
         self.alive = True
-        self.rect = Rect(0, 0, 32, 32) if rect is None else rect
-        self.actions: list = []
-        self.frame: Frame = None
-        ''' Create frames '''
-        self.frames: list = []
-        for i in range(17):
-            if i < 10:
-                self.frames.append(
-                    Frame(
-                        self.rect,
-                        Rect(32 * i, 0, 32, 32),
-                        1
-                    )
-                )
-            else:
-                self.frames.append(
-                    Frame(
-                        self.rect,
-                        Rect(32 * (i - 10), 32, 32, 32),
-                        1
-                    )
-                )
-        ''' Setup actions '''
-        action_frames: list = []
-        if action == 0:
-            action_frames.append(self.frames[1])
-            action_frames.append(self.frames[2])
-            action_frames.append(self.frames[3])
-            action_frames.append(self.frames[4])
-            action_frames.append(self.frames[5])
-            action_frames.append(self.frames[6])
-            action_frames.append(self.frames[7])
-            action_frames.append(self.frames[8])
-            action_frames.append(self.frames[9])
-            action_frames.append(self.frames[0])
-            action_frames.append(self.frames[11])
-            action_frames.append(self.frames[12])
-            action_frames.append(self.frames[13])
-            action_frames.append(self.frames[14])
-            action_frames.append(self.frames[15])
-            action_frames.append(self.frames[16])
-        else:
-            action_frames.append(self.frames[1])
-            action_frames.append(self.frames[2])
-            action_frames.append(self.frames[3])
-            action_frames.append(self.frames[4])
-            action_frames.append(self.frames[11])
-            action_frames.append(self.frames[12])
-            action_frames.append(self.frames[13])
-            action_frames.append(self.frames[14])
-            action_frames.append(self.frames[15])
-            action_frames.append(self.frames[16])
-        self.action = Action(action_frames)
-        self.frame = action_frames[0]
+        self.rect = self.__rect if rect is None else rect
+        self.playhead.play(CLIPS.get(SpriteRegistry.EXPLOSION, 'large' if action == 0 else 'small'))
+        self.playhead.reset()
+        self.frame: ClipFrame = self.playhead.frame()
 
     def update(self, time: int):
-        self.frame = self.action.next_frame()
-        self.frame.collision.center = self.rect.center
+        self.frame = self.playhead.advance(time)
 
     def draw(self, renderer: Renderer) -> None:
         renderer.draw(SpriteRegistry.EXPLOSION, self.frame.src, self.rect)
@@ -255,53 +234,39 @@ class Explosion(Sprite):
         return False
 
     def is_completed(self) -> bool:
-        return self.action.is_completed()
+        return self.playhead.is_completed()
 
 
 class Bullet(GameObject):
     WIDTH = 11
     HEIGHT = 6
+    CLIP = 'bullet'
 
     def __init__(self):
         super().__init__()
         self.alive: bool = True
         self.speed: int = 8
-        self.frame: Frame = None
-        self.frames: list = []
-        self.init_frames()
-        self.action: Action = Action(self.frames)
-        self.rect: Rect = self.frames[0].collision
-        self.frame = self.frames[0]
-
-    def init_frames(self):
-        self.frames.append(
-            Frame(Rect(0, 0, 11, 6), Rect(0, 5, 11, 6), 1)
-        )
-        self.frames.append(
-            Frame(Rect(0, 0, 11, 8), Rect(16, 4, 11, 8), 1)
-        )
-        self.frames.append(
-            Frame(Rect(0, 0, 11, 10), Rect(32, 3, 11, 10), 1)
-        )
-        self.frames.append(
-            Frame(Rect(0, 0, 11, 12), Rect(48, 2, 11, 12), 1)
-        )
-        self.frames.append(
-            Frame(Rect(0, 0, 11, 14), Rect(64, 1, 11, 14), 1)
-        )
-        self.frames.append(
-            Frame(Rect(0, 0, 11, 16), Rect(80, 0, 11, 16), 1)
-        )
+        self.rect: Rect = Rect(0, 0, self.WIDTH, self.HEIGHT)
+        self.playhead: Playhead = Playhead(CLIPS.get(SpriteRegistry.BULLET, self.CLIP))
+        self.frame: ClipFrame = self.playhead.frame()
+
+    def reset(self) -> None:
+        self.alive = True
+        self.playhead.reset()
+        self.frame = self.playhead.frame()
 
     def update(self, time: int) -> None:
         self.rect.left += self.speed
-        self.frame = self.action.next_frame()
-        self.frame.collision.topleft = self.rect.topleft
-        index = self.frames.index(self.frame)
-        self.frame.collision.top -= index
+        self.frame = self.playhead.advance(time)
 
     def draw(self, renderer: Renderer) -> None:
-        renderer.draw(SpriteRegistry.BULLET, self.frame.src, self.frame.collision)
+        offset = self.frame.offset
+        x, y = renderer.lerp(self.previous_position(), self.rect.topleft)
+        renderer.draw(SpriteRegistry.BULLET, self.frame.src, (x + offset[0], y + offset[1]))
+
+    def previous_position(self) -> tuple:
+        ''' Position one tick ago, bullets move at a constant speed '''
+        return (self.rect.left - self.speed, self.rect.top)
 
     def is_alive(self) -> bool:
         return self.alive
@@ -310,55 +275,47 @@ class Bullet(GameObject):
         self.alive = False
 
     def collide(self, other: GameObject) -> bool:
-        if self.is_alive() is False:
+        if self.is_alive() is False or self.rect.colliderect(other.rect) == 0:
             return False
-        return self.rect.colliderect(other.rect)
+        return MASKS.overlap(None, self.rect, other.mask, other.rect)
 
     def align(self, src: Rect) -> None:
         self.rect.midleft = src.center
 
 
 class DiagUpBullet(Bullet):
-    def __init__(self):
-        super().__init__()
-
-    def init_frames(self):
-        self.frames.append(
-            Frame(Rect(0, 0, 10, 10), Rect(275, 35, 10, 10), 1)
-        )
-        self.frames.append(
-            Frame(Rect(0, 0, 15, 14), Rect(289, 33, 15, 14), 1)
-        )
+    WIDTH = 10
+    HEIGHT = 10
+    CLIP = 'diag_up'
 
     def update(self, time: int) -> None:
         self.rect.left += self.speed
         self.rect.top -= self.speed
-        self.frame = self.action.next_frame()
-        self.frame.collision.topleft = self.rect.topleft
+        self.frame = self.playhead.advance(time)
 
+    def previous_position(self) -> tuple:
+        return (self.rect.left - self.speed, self.rect.top + self.speed)
 
-class DiagDownBullet(Bullet):
-    def __init__(self):
-        super().__init__()
 
-    def init_frames(self):
-        self.frames.append(
-            Frame(Rect(0, 0, 10, 10), Rect(275, 51, 10, 10), 1)
-        )
-        self.frames.append(
-            Frame(Rect(0, 0, 15, 14), Rect(289, 49, 15, 14), 1)
-        )
+class DiagDownBullet(Bullet):
+    WIDTH = 10
+    HEIGHT = 10
+    CLIP = 'diag_down'
 
     def update(self, time: int) -> None:
         self.rect.left += self.speed
         self.rect.top += self.speed
-        self.frame = self.action.next_frame()
-        self.frame.collision.topleft = self.rect.topleft
+        self.frame = self.playhead.advance(time)
+
+    def previous_position(self) -> tuple:
+        return (self.rect.left - self.speed, self.rect.top - self.speed)
 
 
 class Craft(GameObject):
     WIDTH = 32
     HEIGHT = 24
+    AUTO_FIRE_TICKS = 6  # Ticks between shots while fire is held
+    ACTION_CLIPS = ('flying', 'up', 'down', 'restore_up', 'restore_down')  # Indexed by action
 
     def __init__(self, boundary: tuple):
         super().__init__()
@@ -369,45 +326,33 @@ class Craft(GameObject):
         self.alive: bool = True
         self.rect: Rect = Rect(0, 0, self.WIDTH, 14)
         self.bullets: list = []
-        self.shoot_tick: int = 0
-        self.frame: Frame = None
+        self.input: InputSnapshot = IDLE_INPUT
+        self.__since_shot: int = self.AUTO_FIRE_TICKS
         self.__powerups: list = []
         self.__max_bullets: int = 3
-        ''' Setup frames '''
-        self.frames: list = []
-        self.actions: list = []
-        off_x = 0
-        off_y = 0
-        for i in range(14):
-            if i == 5 or i == 10:
-                off_x = 0
-                off_y += 1
-            self.frames.append(
-                Frame(
-                    Rect(0, 0, self.WIDTH, 14),
-                    Rect(off_x * self.WIDTH, off_y * self.HEIGHT, self.WIDTH, self.HEIGHT),
-                    1
-                )
-            )
-            off_x += 1
-        ''' Setup actions '''
-        self.actions.append(Action([self.frames[0]]))  # Flying
-        self.actions.append(Action([self.frames[1], self.frames[2]]))  # Up
-        self.actions.append(Action([self.frames[3], self.frames[4]]))  # Down
-        self.actions.append(Action([self.frames[2], self.frames[1], self.frames[0]]))  # Restore Up
-        self.actions.append(Action([self.frames[4], self.frames[3], self.frames[0]]))  # Restore Down
-
-    def set_input(self, input: Input) -> None:
+        self.clips: list = [CLIPS.get(SpriteRegistry.CRAFT, name) for name in self.ACTION_CLIPS]
+        self.playhead: Playhead = Playhead(self.clips[0])
+        self.frame: ClipFrame = self.playhead.frame()
+        self.mask = MASKS.get(SpriteRegistry.CRAFT, self.frame.src)
+        self.previous: tuple = None
+
+    @classmethod
+    def frames(cls) -> set:
+        ''' Source rects of every frame the craft can show '''
+        return {frame.src for name in cls.ACTION_CLIPS for frame in CLIPS.get(SpriteRegistry.CRAFT, name).frames}
+
+    def set_input(self, input: InputSnapshot) -> None:
         self.input = input
 
     def update(self, time: int) -> None:
+        self.previous = self.rect.topleft
         if self.is_alive() is False:
             self.explosion.update(time)
             self.update_bullets(time)
             return
         ''' Update velocity according to user input '''
         vel = Vector2(0, 0)
-        dir = self.input.get_direction()
+        dir = self.input
         vel.x = dir.x * self.speed
         vel.y = dir.y * self.speed
         ''' define current action '''
@@ -423,12 +368,10 @@ class Craft(GameObject):
             else:
                 self.action = 0
         ''' end define current action '''
-        self.frame = self.actions[self.action].next_frame()
-
-        ''' When action is change then reset the state of other actions '''
-        for i, action in enumerate(self.actions):
-            if i != self.action:
-                action.reset()
+        ''' Playback restarts when the action changes '''
+        self.playhead.play(self.clips[self.action])
+        self.frame = self.playhead.advance(time)
+        self.mask = MASKS.get(SpriteRegistry.CRAFT, self.frame.src)
 
         ''' Store the current position to the sprite rect '''
         self.rect.left += vel.x
@@ -443,22 +386,24 @@ class Craft(GameObject):
             self.rect.top = 0
         if self.rect.top > self.boundary[1] - self.HEIGHT:
             self.rect.top = self.boundary[1] - self.HEIGHT
-
-        ''' Update the position of the frame according to current sprite rect '''
-        self.frame.collision.topleft = self.rect.topleft
-        buttons = self.input.get_buttons()
-        if buttons.is_pressed(State.X):
+        ''' Fire on press, then keep firing at the auto fire rate while held '''
+        self.__since_shot += 1
+        if self.input.pressed(State.X) \
+                or (self.input.held(State.X) and self.__since_shot >= self.AUTO_FIRE_TICKS):
             self.shoot(time)
         self.update_bullets(time)
 
     def update_bullets(self, time: int) -> None:
+        live: list = []
         for bullet in self.bullets:
             bullet.update(time)
             if bullet.rect.left > self.boundary[0] or bullet.rect.bottom < 0 \
-                    or bullet.rect.top > self.boundary[1] or bullet.is_alive() is False:
-                self.bullets.remove(bullet)
-            if isinstance(bullet, Explosion) and bullet.is_completed() is True:
-                self.bullets.remove(bullet)
+                    or bullet.rect.top > self.boundary[1] or bullet.is_alive() is False \
+                    or (isinstance(bullet, Explosion) and bullet.is_completed() is True):
+                POOLS[type(bullet)].release(bullet)
+                continue
+            live.append(bullet)
+        self.bullets[:] = live
 
     def power_up(self, item: int) -> None:
         if (item == PowerUp.EXTRA_BULLET):
@@ -470,29 +415,25 @@ class Craft(GameObject):
     def shoot(self, time: int) -> None:
         if len(self.bullets) >= self.__max_bullets:
             return
-        ''' Add delay for each bullet shooting '''
-        if self.shoot_tick < 5 and len(self.bullets) > 0:
-            self.shoot_tick += 1
-            return
-        self.shoot_tick = 0
+        self.__since_shot = 0
         blts = self.__get_bullets()
         for tmp in blts:
             self.bullets.append(tmp)
             tmp.align(self.rect)
-        post(Event(Engine.GAME_EVENT, gtype=GameEvent.CRAFT_SHOOTED))
+        BUS.publish(GameEvent.CRAFT_SHOOTED)
 
     def __get_bullets(self) -> list:
         for power in self.__powerups:
             if power == 0:
-                return [Bullet(), DiagUpBullet(), DiagDownBullet()]
-        return [Bullet()]
+                return [POOLS[Bullet].acquire(), POOLS[DiagUpBullet].acquire(), POOLS[DiagDownBullet].acquire()]
+        return [POOLS[Bullet].acquire()]
 
     def draw(self, renderer: Renderer) -> None:
         if self.is_alive() is False:
             self.explosion.draw(renderer)
             self.draw_bullets(renderer)
             return
-        renderer.draw(SpriteRegistry.CRAFT, self.frame.src, self.frame.collision)
+        renderer.draw(SpriteRegistry.CRAFT, self.frame.src, renderer.lerp(self.previous, self.rect.topleft))
         self.draw_bullets(renderer)
 
     def draw_bullets(self, renderer: Renderer):
@@ -506,17 +447,26 @@ class Craft(GameObject):
         if self.alive is True:
             self.alive = False
             self.explosion.rect.center = self.rect.center
-            post(Event(Engine.GAME_EVENT, gtype=GameEvent.PLAYER_DESTROYED))
+            BUS.publish(GameEvent.PLAYER_DESTROYED)
 
-    def collide(self, other: GameObject) -> bool:
+    def broadphase(self, grid: SpatialHash) -> None:
+        ''' Insert the craft and its live bullets into the collision grid '''
+        grid.insert(self, CollisionGroup.CRAFT)
         for b in self.bullets:
+            if isinstance(b, Bullet) and b.is_alive():
+                grid.insert(b, CollisionGroup.BULLETS)
+
+    def collide(self, other: GameObject, grid: SpatialHash = None) -> bool:
+        ''' When a grid is given only the bullets sharing a cell with other are tested '''
+        bullets = self.bullets if grid is None else grid.query(other.rect, CollisionGroup.BULLETS)
+        for b in bullets:
             if other.is_alive() and b.collide(other):
                 b.destroy()
                 # Append the explosion sprite for bullet that was hit
                 # Pass by ref the rect of objet that the bullet has hit
                 # so eplosion of bullet can follow the object if it is
                 # still alive.
-                self.bullets.append(Explosion(1, other.rect))
+                self.bullets.append(POOLS[Explosion].acquire(1, other.rect))
                 return True
         return False
 
@@ -528,32 +478,47 @@ class Craft(GameObject):
 
 
 class Asteroid(GameObject):
-    def __init__(self, boundary: tuple, skin: int = None):
+    VARIANTS = (
+        Rect(145, 130, 30, 36),
+        Rect(146, 170, 30, 29),
+        Rect(193, 228, 47, 51),
+        Rect(240, 225, 48, 53),
+        Rect(147, 288, 61, 72),
+        Rect(208, 282, 109, 77),
+    )
+
+    def __init__(self, boundary: tuple, skin: int = None, emitter: Emitter = None):
         super().__init__()
+        self.explosion: Optional[Explosion] = None
+        self.reset(boundary, skin, emitter)
+
+    def reset(self, boundary: tuple, skin: int = None, emitter: Emitter = None) -> None:
         self.alive = True
+        self.emitter: Optional[Emitter] = emitter
         self.life = 2
-        self.explosion = Explosion()
-        self.speed = randint(3, 5)
+        self.speed = ASTEROID_RNG.randint(3, 5)
         self.points = self.speed
-        self.variants: list = []
-        self.variants.append(Rect(145, 130, 30, 36))
-        self.variants.append(Rect(146, 170, 30, 29))
-        self.variants.append(Rect(193, 228, 47, 51))
-        self.variants.append(Rect(240, 225, 48, 53))
-        self.variants.append(Rect(147, 288, 61, 72))
-        self.variants.append(Rect(208, 282, 109, 77))
-        skin = randint(0, 4) if skin is None else skin
+        skin = ASTEROID_RNG.randint(0, 4) if skin is None else skin
         if skin > 1 and skin < 4:
             self.life = 4
         elif skin >= 4:
             self.life = 6
-        self.src_rect = self.variants[skin]
+        self.src_rect = self.VARIANTS[skin]
+        self.mask = MASKS.get(SpriteRegistry.ASTEROID, self.src_rect)
+        ''' Always a new rect, bullet explosions may still follow the old one '''
         self.rect = Rect(
             boundary[0],
-            randint(-self.src_rect.height, boundary[1] - self.src_rect.height),
+            ASTEROID_RNG.randint(-self.src_rect.height, boundary[1] - self.src_rect.height),
             self.src_rect.width,
             self.src_rect.height)
 
+    def release(self) -> None:
+        ''' Return the asteroid and its explosion to their pools '''
+        if self.explosion is not None:
+            POOLS[Explosion].release(self.explosion)
+            self.explosion = None
+        POOLS[Asteroid].release(self)
+
     def update(self, time: int) -> None:
         if self.is_alive() is False:
             self.explosion.update(time)
@@ -564,87 +529,174 @@ class Asteroid(GameObject):
         if self.is_alive() is False:
             self.explosion.draw(renderer)
             return
-        renderer.draw(SpriteRegistry.ASTEROID, self.src_rect, self.rect)
+        previous = (self.rect.left + self.speed, self.rect.top)
+        renderer.draw(SpriteRegistry.ASTEROID, self.src_rect, renderer.lerp(previous, self.rect))
 
     def is_alive(self) -> bool:
         return self.alive
 
     def destroy(self) -> None:
         self.life -= 1
-        post(Event(Engine.GAME_EVENT, gtype=GameEvent.ENEMY_DESTROYED, points=self.points))
+        BUS.publish(GameEvent.ENEMY_DESTROYED, self.points)
         if self.life <= 0:
             self.alive = False
+            self.explosion = POOLS[Explosion].acquire()
             self.explosion.rect.center = self.rect.center
 
     def collide(self, other: GameObject) -> bool:
-        if self.is_alive() is False:
+        if self.is_alive() is False or self.rect.colliderect(other.rect) == 0:
             return False
-        return self.rect.colliderect(other.rect)
+        return MASKS.overlap(self.mask, self.rect, other.mask, other.rect)
 
     def powerup(self) -> Optional[PowerUp]:
         pass
 
 
 class AsteroidWave(GameObject):
+    EMITTER_EVERY = 8  # Every n-th asteroid fires a bullet pattern
 
     def __init__(self, boundary: tuple):
         super().__init__()
         self.items: list = []
         self.timer = Timer(300)
         self.boundary: tuple = boundary
+        self.grid: SpatialHash = SpatialHash(boundary)
+        self.bullets: BulletField = BulletField(boundary)
+        self.target: Rect = Rect(0, boundary[1] // 2, 0, 0)  # Where aimed patterns shoot at
+        self.spawned: int = 0
+        self.destroyed: list = []  # Hit last tick, released once the caller is done with them
 
     def update(self, time: int) -> None:
+        for item in self.destroyed:
+            item.release()
+        self.destroyed.clear()
         if self.timer.looped(time):
-            self.items.append(Asteroid(self.boundary, 1))
+            self.items.append(POOLS[Asteroid].acquire(self.boundary, 1, self.__emitter()))
+            self.spawned += 1
+        live: list = []
         for item in self.items:
             item.update(time)
+            if item.emitter is not None and item.is_alive():
+                item.emitter.update(time, self.bullets, item.rect.center, self.target.center)
             if item.rect.right < 0:
-                self.items.remove(item)
+                item.release()
+                continue
+            live.append(item)
+        self.items[:] = live
+        self.bullets.update(time)
+
+    def __emitter(self) -> Optional[Emitter]:
+        if self.spawned % self.EMITTER_EVERY != self.EMITTER_EVERY - 1:
+            return None
+        pattern = (self.spawned // self.EMITTER_EVERY) % 3
+        if pattern == Emitter.RADIAL:
+            return Emitter(Emitter.RADIAL, 1200, 12, 2.0, 0)
+        if pattern == Emitter.SPIRAL:
+            return Emitter(Emitter.SPIRAL, 200, 4, 2.5, 1)
+        return Emitter(Emitter.AIMED_FAN, 900, 5, 3.0, 2)
 
     def draw(self, renderer: Renderer) -> None:
         for item in self.items:
             item.draw(renderer)
-
-    def collide(self, other: Craft) -> list:
+        self.bullets.draw(renderer)
+
+    def collide(self, other: Craft, grid: SpatialHash = None) -> list:
+        '''
+        Test the asteroids against the craft and its bullets. The grid is
+        rebuilt from the craft unless an up to date one is given.
+        '''
+        if grid is None:
+            grid = self.grid
+            grid.clear()
+            other.broadphase(grid)
         hits: list = []  # How many asteroids were hit
         for item in self.items:
             ''' When asteroid collide with bullet of Craft '''
-            if other.collide(item):
+            if other.collide(item, grid):
                 item.destroy()
                 if item.is_alive() is False:
                     hits.append(item)
-                    self.items.remove(item)
-            if item.collide(other):
-                other.destroy()
+            for craft in grid.query(item.rect, CollisionGroup.CRAFT):
+                if item.collide(craft):
+                    craft.destroy()
+        if other.is_alive() and self.bullets.collide(other.rect):
+            other.destroy()
+        if len(hits) > 0:
+            self.items[:] = [item for item in self.items if item.is_alive()]
+            self.destroyed.extend(hits)
         return hits
 
 
+def glyph_table(chars: str, per_row: int, width: int, height: int) -> dict:
+    ''' Source rect of every char of a font sheet laid out left to right, `per_row` glyphs per row '''
+    table: dict = {}
+    for n, char in enumerate(chars):
+        row, column = divmod(n, per_row)
+        table[char] = (column * width, row * height, width, height)
+    return table
+
+
 class FontSprite(Sprite):
+    '''
+    A line of text at a fixed position. The glyphs are composed into a single
+    image, named after the sprite, whenever the text changes so every frame
+    only costs one blit. Each FontSprite needs its own name. Chars missing
+    from the sheet, space included, are left blank.
+    '''
     WIDTH = 12
     HEIGHT = 12
-    CHAR_PER_ROW = 29
+    CHAR_PER_ROW = 30
+    ADVANCE = 8  # Glyphs overlap, the cursor moves less than a glyph width
+    CHARS = ''.join(chr(c) for c in range(ord('!'), ord('}') + 1))  # Printable ASCII but space and ~
+    GLYPHS: dict = glyph_table(CHARS, CHAR_PER_ROW, WIDTH, HEIGHT)
 
-    def __init__(self):
+    def __init__(self, name: str = 'score', position: tuple = (120, 10)):
         super().__init__()
-        self.letters: list = []
-        self.chars = ['!', '"', '#', '$', '%', '&', '\'', '(', ')', '*', '+',
-                      ',', '-', '.', '/', '0', '1', '2', '3', '4', '5', '6',
-                      '7', '8', '9', ':', ';', '<', '=', '>', '?', '@', 'A',
-                      'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L',
-                      'M', 'N', 'O', 'P', 'Q', 'R', 'S', 'T', 'U', 'V', 'W',
-                      'X', 'Y', 'Z', '[', '\\', ']', '^', '_', '`', 'a', 'b',
-                      'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j']
+        self.name: tuple = ('text', name)
+        self.position: tuple = position
+        self.text: str = ''
+        self.src: Rect = Rect(0, 0, 0, self.HEIGHT)
+        self.dest: Rect = Rect(position, self.src.size)
+        self.composed: bool = False
 
     def display(self, text: str) -> None:
-        self.letters = [char for char in text]
+        if text != self.text:
+            self.text = text
+            self.composed = False
+
+    def compose(self, renderer: Renderer) -> None:
+        parts: list = []
+        cursor: int = 0
+        for char in self.text:
+            glyph = self.GLYPHS.get(char)
+            if glyph is not None:
+                parts.append((SpriteRegistry.FONTS, glyph, (cursor, 0)))
+            cursor += self.ADVANCE
+        width = cursor - self.ADVANCE + self.WIDTH
+        renderer.compose_image(self.name, (width, self.HEIGHT), parts, True, LAYERS[SpriteRegistry.FONTS])
+        self.src = Rect(0, 0, width, self.HEIGHT)
+        self.dest = Rect(self.position, self.src.size)
+        self.composed = True
 
     def draw(self, renderer: Renderer) -> None:
-        cursor: int = 120
-        for char in self.letters:
-            n = self.chars.index(char)
-            y = (n // self.CHAR_PER_ROW) * self.HEIGHT
-            x = (n % (self.CHAR_PER_ROW + 1)) * self.WIDTH
-            src = Rect(x, y, self.WIDTH, self.HEIGHT)
-            dest = Rect(cursor, 10, self.WIDTH, self.HEIGHT)
-            renderer.draw(SpriteRegistry.FONTS, src, dest)
-            cursor += 8
+        if len(self.text) == 0:
+            return
+        if self.composed is False:
+            self.compose(renderer)
+        renderer.draw(self.name, self.src, self.dest, BLEND_PREMULTIPLIED)
+
+
+register_clips(CLIPS)
+
+POOLS: dict = {
+    Bullet: Pool(Bullet),
+    DiagUpBullet: Pool(DiagUpBullet),
+    DiagDownBullet: Pool(DiagDownBullet),
+    Explosion: Pool(Explosion),
+    Asteroid: Pool(Asteroid),
+}
+
+
+def pool_stats() -> dict:
+    ''' Hit and miss counters of every pool, keyed by class name '''
+    return {cls.__name__: pool.stats() for cls, pool in POOLS.items()}
@@ -0,0 +1,50 @@
+import json
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class Timeline(object):
+    '''
+    Phases and marks of the game startup, in ms since this module was
+    imported. main.py imports it first so the imports are part of the
+    timeline too.
+    '''
+
+    def __init__(self):
+        self.start: float = perf_counter()
+        self.phases: list = []
+        self.marks: dict = {}
+
+    def now(self) -> float:
+        return (perf_counter() - self.start) * 1000
+
+    @contextmanager
+    def phase(self, name: str):
+        begin = self.now()
+        try:
+            yield
+        finally:
+            self.phases.append((name, begin, self.now()))
+
+    def mark(self, name: str) -> None:
+        ''' Record the first time a point is reached, later calls are ignored '''
+        self.marks.setdefault(name, self.now())
+
+    def report(self) -> None:
+        width = max([len(name) for name, _, _ in self.phases] + [len(name) for name in self.marks] + [13]) + 2
+        print("{:<{w}}{:>10}{:>10}".format('startup phase', 'start ms', 'took ms', w=width))
+        for name, begin, end in self.phases:
+            print("{:<{w}}{:>10.1f}{:>10.1f}".format(name, begin, end - begin, w=width))
+        for name, at in sorted(self.marks.items(), key=lambda mark: mark[1]):
+            print("{:<{w}}{:>10.1f}".format(name, at, w=width))
+
+    def export(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump({
+                'phases': [{'name': name, 'start_ms': begin, 'duration_ms': end - begin}
+                           for name, begin, end in self.phases],
+                'marks': self.marks,
+            }, f, indent=2)
+
+
+TIMELINE: Timeline = Timeline()
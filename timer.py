@@ -15,3 +15,18 @@ class Timer(object):
             self.counter = 0
             return True
         return False
+
+
+class FixedClock(object):
+    ''' Stand-in for pygame Clock that advances by a fixed step and never sleeps '''
+
+    def __init__(self, step: int):
+        self.step: int = step
+        self.ticks: int = 0
+
+    def tick(self, framerate: int = 0) -> int:
+        self.ticks += 1
+        return self.step
+
+    def get_time(self) -> int:
+        return self.step
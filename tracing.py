@@ -0,0 +1,128 @@
+import json
+from time import perf_counter_ns, strftime
+
+
+class Span(object):
+    ''' Times a `with` block into the tracer ring '''
+    __slots__ = ('tracer', 'name', 'start')
+
+    def __init__(self, tracer: 'Tracer', name: str):
+        self.tracer: Tracer = tracer
+        self.name: str = name
+        self.start: int = 0
+
+    def __enter__(self) -> 'Span':
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.tracer.record('X', self.name, self.start, perf_counter_ns() - self.start)
+
+
+class FrameSpan(Span):
+    ''' Span of a whole frame, a slow one makes the tracer dump the ring '''
+    __slots__ = ()
+
+    def __exit__(self, *exc) -> None:
+        duration = perf_counter_ns() - self.start
+        self.tracer.record('X', self.name, self.start, duration)
+        self.tracer.end_frame(duration)
+
+
+class NullSpan(object):
+    ''' Shared span handed out while tracing is disabled '''
+    __slots__ = ()
+
+    def __enter__(self) -> 'NullSpan':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+NULL_SPAN: NullSpan = NullSpan()
+
+
+class Tracer(object):
+    '''
+    Records spans and counters into a fixed size ring buffer that can be
+    written out as Chrome trace JSON, for chrome://tracing or Perfetto.
+    Spans nest by time. While disabled `span` returns a shared no-op span
+    and `counter` returns right away.
+    '''
+    CAPACITY = 65536
+    SPIKE_COOLDOWN = 300  # Frames to wait after an automatic dump
+
+    def __init__(self, capacity: int = CAPACITY):
+        self.enabled: bool = False
+        self.capacity: int = capacity
+        self.spike_ms: float = 0.0
+        self.dumps: list = []
+        self.__ring: list = [None] * capacity
+        self.__next: int = 0
+        self.__size: int = 0
+        self.__cooldown: int = 0
+
+    def enable(self, spike_ms: float = 0.0) -> None:
+        ''' Start recording, frames longer than `spike_ms` dump the ring when it is above 0 '''
+        self.enabled = True
+        self.spike_ms = spike_ms
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def span(self, name: str):
+        if self.enabled is False:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def frame(self):
+        if self.enabled is False:
+            return NULL_SPAN
+        return FrameSpan(self, 'frame')
+
+    def counter(self, name: str, value: float) -> None:
+        if self.enabled is False:
+            return
+        self.record('C', name, perf_counter_ns(), value)
+
+    def record(self, phase: str, name: str, start: int, value) -> None:
+        self.__ring[self.__next] = (phase, name, start, value)
+        self.__next = (self.__next + 1) % self.capacity
+        self.__size = min(self.__size + 1, self.capacity)
+
+    def end_frame(self, duration: int) -> None:
+        if self.__cooldown > 0:
+            self.__cooldown -= 1
+        elif self.spike_ms > 0 and duration > self.spike_ms * 1000000:
+            self.dump()
+            self.__cooldown = self.SPIKE_COOLDOWN
+
+    def events(self) -> list:
+        ''' Recorded entries, oldest first, as Chrome trace events '''
+        start = (self.__next - self.__size) % self.capacity
+        entries = [self.__ring[(start + i) % self.capacity] for i in range(self.__size)]
+        events: list = []
+        for phase, name, ts, value in entries:
+            if phase == 'X':
+                events.append({'name': name, 'ph': 'X', 'ts': ts / 1000, 'dur': value / 1000, 'pid': 1, 'tid': 1})
+            else:
+                events.append({'name': name, 'ph': 'C', 'ts': ts / 1000, 'pid': 1, 'args': {name: value}})
+        return events
+
+    def dump(self, path: str = None) -> str:
+        ''' Write the ring as Chrome trace JSON, by default to a timestamped file '''
+        if path is None:
+            path = "trace-{}-{}.json".format(strftime('%Y%m%d-%H%M%S'), len(self.dumps))
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.events(), 'displayTimeUnit': 'ms'}, f)
+        self.dumps.append(path)
+        return path
+
+    def clear(self) -> None:
+        self.__ring = [None] * self.capacity
+        self.__next = 0
+        self.__size = 0
+
+
+TRACER: Tracer = Tracer()